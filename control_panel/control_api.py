@@ -114,7 +114,10 @@ async def get_status():
         "current_video_id": controller.current_video_id,
         "is_comment_processing": controller.is_comment_processing(),
         "operation_mode": controller.operation_mode,
-        "voice_status": controller.get_voice_status()
+        "voice_status": controller.get_voice_status(),
+        "comment_queue": controller.get_comment_queue_status(),
+        "memory_status": controller.memory.get_status(),
+        "memory_cache": controller.memory.cache_stats()
     }
 
 @app.post("/mode/set")
@@ -65,7 +65,8 @@ class CommentListener:
                         timestamp = datetime.now(timezone.utc)  # デフォルト値
                         if hasattr(c, 'timestamp'):
                             try:
-                                timestamp = datetime.fromtimestamp(c.timestamp, timezone.utc)
+                                # pytchat の timestamp は UNIX 時刻のミリ秒
+                                timestamp = datetime.fromtimestamp(c.timestamp / 1000, timezone.utc)
                             except (ValueError, OSError):
                                 pass  # 無効なタイムスタンプの場合は現在時刻を使用
                         
@@ -73,7 +74,9 @@ class CommentListener:
                             id=c.id,
                             author=c.author.name,
                             text=c.message,
-                            timestamp=timestamp
+                            timestamp=timestamp,
+                            is_super_chat=getattr(c, 'type', None) in ("superChat", "superSticker"),
+                            is_member=bool(getattr(c.author, 'isChatSponsor', False))
                         )
                         # キューに追加（Producer）
                         await self._comment_queue.put(comment)
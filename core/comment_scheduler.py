@@ -0,0 +1,158 @@
+"""
+コメントスケジューラーモジュール
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from .models import Comment
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_PRIORITY_WEIGHTS = {
+    "score": 1.0,       # CommentScorer のスコア（0.0-1.0）
+    "super_chat": 3.0,  # スーパーチャット
+    "member": 0.5,      # メンバーシップ
+    "voice": 5.0,       # 配信者の音声入力
+    "high": 1.0,        # priority="high" のコメント
+    "aging": 0.02       # 待ち時間1秒あたりの加点
+}
+
+class CommentScheduler(asyncio.Queue):
+    """
+    優先度付きのコメントキュー（asyncio.Queue と同じ使い方で、優先度の高い順に取り出す）
+
+    優先度 = 各特徴量の重み付き和 + aging × 待ち時間（秒）。
+    待ち時間による加点はすべてのコメントで同じ速さで増えるため、
+    「重み付き和 - aging × 到着時刻」をキーにしたヒープで順序が保たれる。
+
+    コメントが殺到したときは、投稿から max_age 秒を過ぎたコメントを取り出さずに捨て、
+    max_depth 件を超えた分は優先度の最も低いコメントから捨てる（put は待たせない）。
+    """
+
+    def __init__(self, scorer: Optional[Callable[[Comment], float]] = None,
+                 weights: Optional[Dict[str, float]] = None, maxsize: int = 0,
+                 max_age: Optional[float] = None, max_depth: int = 0):
+        """
+        初期化
+
+        Args:
+            scorer: コメントのスコアを返す関数（None の場合はスコアを使わない）
+            weights: 優先度の重み（省略したキーは既定値）
+            maxsize: キューの最大件数（0 は無制限、超えると put が待つ）
+            max_age: 投稿からこの秒数を過ぎたコメントは処理しない（None は無制限）
+            max_depth: 溜めておくコメントの最大件数（0 は無制限、超えると優先度の低いものを捨てる）
+        """
+        self.scorer = scorer
+        self.weights = {**DEFAULT_PRIORITY_WEIGHTS, **(weights or {})}
+        self.max_age = max_age
+        self.max_depth = max_depth
+        self._counter = itertools.count()  # 同じ優先度なら到着順
+        self.served = 0
+        self.dropped_stale = 0
+        self.dropped_shed = 0
+        self._latencies = deque(maxlen=200)  # 直近の応答までの秒数
+        super().__init__(maxsize=maxsize)
+
+    def priority(self, comment: Comment) -> float:
+        """到着時点の優先度（待ち時間による加点を除く）"""
+        w = self.weights
+        score = self.scorer(comment) if self.scorer else 0.0
+        return (w["score"] * score
+                + w["super_chat"] * comment.is_super_chat
+                + w["member"] * comment.is_member
+                + w["voice"] * (comment.source == "voice" or comment.is_voice_input)
+                + w["high"] * (comment.priority == "high"))
+
+    @staticmethod
+    def age(comment: Comment) -> float:
+        """投稿からの経過秒数"""
+        return (datetime.now(comment.timestamp.tzinfo) - comment.timestamp).total_seconds()
+
+    def is_stale(self, comment: Comment) -> bool:
+        return self.max_age is not None and self.age(comment) > self.max_age
+
+    def put_nowait(self, comment: Comment) -> None:
+        # 届いた時点で期限切れのコメントは溜めない（件数の上限に数えず、期限切れとして集計する）
+        if self.is_stale(comment):
+            self.dropped_stale += 1
+            logger.debug(f"投稿から{self.age(comment):.0f}秒経過したため受け付けませんでした: {comment.author}: {comment.text}")
+            return
+        super().put_nowait(comment)
+        if self.max_depth and len(self._queue) > self.max_depth:
+            # 現在の優先度が最も低いもの（ヒープの符号を反転したキーが最大のもの）を捨てる
+            lowest = max(range(len(self._queue)), key=lambda i: self._queue[i][:2])
+            shed = self._queue.pop(lowest)[2]
+            heapq.heapify(self._queue)
+            self.task_done()
+            self.dropped_shed += 1
+            logger.debug(f"コメントが溜まりすぎたため破棄しました: {shed.author}: {shed.text}")
+
+    async def get(self) -> Comment:
+        """優先度の最も高いコメントを取り出す（期限切れのコメントは捨てて次を待つ）"""
+        while True:
+            comment = await super().get()
+            if not self.is_stale(comment):
+                return comment
+            self.task_done()
+            self.dropped_stale += 1
+            logger.debug(f"投稿から{self.age(comment):.0f}秒経過したため破棄しました: {comment.author}: {comment.text}")
+
+    def requeue(self, comment: Comment) -> None:
+        """
+        取り出したコメントを処理せずに戻す（一時停止と同時に取り出した場合など）
+
+        処理件数・破棄件数には数えず、task_done も呼ばない（取り出す前の状態に戻すだけ）。
+        待ち時間による加点は投稿からの経過時間で計算し直す。
+        """
+        waited = max(0.0, self.age(comment))
+        key = self.priority(comment) - self.weights["aging"] * (time.monotonic() - waited)
+        heapq.heappush(self._queue, (-key, next(self._counter), comment))
+        self._wakeup_next(self._getters)
+
+    def drop_stale(self) -> int:
+        """期限切れのコメントをまとめて捨てる（empty() で残りを確認する前に呼ぶ）"""
+        if self.max_age is None:
+            return 0
+        kept = [entry for entry in self._queue if not self.is_stale(entry[2])]
+        dropped = len(self._queue) - len(kept)
+        if dropped:
+            self._queue[:] = kept
+            heapq.heapify(self._queue)
+            for _ in range(dropped):
+                self.task_done()
+            self.dropped_stale += dropped
+            logger.info(f"投稿から{self.max_age:.0f}秒を過ぎたコメントを{dropped}件破棄しました")
+        return dropped
+
+    def record_served(self, comment: Comment) -> None:
+        """コメントへの応答が終わったことを記録する（投稿から応答までの秒数を集計）"""
+        self.served += 1
+        self._latencies.append(self.age(comment))
+
+    def stats(self) -> Dict[str, Any]:
+        """処理件数・破棄件数・応答までの秒数"""
+        latencies = sorted(self._latencies)
+        return {
+            "depth": self.qsize(),
+            "served": self.served,
+            "dropped_stale": self.dropped_stale,
+            "dropped_shed": self.dropped_shed,
+            "latency_avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2) if latencies else None
+        }
+
+    # asyncio.Queue の格納方法をヒープに差し替える
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, comment: Comment):
+        key = self.priority(comment) - self.weights["aging"] * time.monotonic()
+        heapq.heappush(self._queue, (-key, next(self._counter), comment))
+
+    def _get(self) -> Comment:
+        return heapq.heappop(self._queue)[2]
@@ -42,10 +42,63 @@ class Config:
     # Prompt Settings
     DEFAULT_PROMPT_FILE = "comment_mode.txt"
     MAX_HISTORY_TURNS = 1000
+    # "json"（ファイル）または "sqlite"（会話履歴・記憶のメタデータ・トリプルを1つの DB に保存）
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+    SQLITE_PATH = os.path.join(STORAGE_DIR, "aivtuber.db")
+    HISTORY_PROMPT_MAX_TURNS = int(os.getenv("HISTORY_PROMPT_MAX_TURNS", "10"))  # プロンプトに含める直近の会話の件数
+    HISTORY_PROMPT_MAX_TOKENS = int(os.getenv("HISTORY_PROMPT_MAX_TOKENS", "1500"))  # 直近の会話のトークン数の上限（概算）
+    HISTORY_BACKUP_RETENTION = int(os.getenv("HISTORY_BACKUP_RETENTION", "200"))  # 復元できるように残すバックアップの時点数
+    
+    # Long-term Memory Settings
+    MEMORY_QUERY_CACHE_SIZE = int(os.getenv("MEMORY_QUERY_CACHE_SIZE", "256"))
+    MEMORY_QUERY_CACHE_TTL = float(os.getenv("MEMORY_QUERY_CACHE_TTL", "600"))  # 秒
+    MEMORY_INDEX_TYPE = os.getenv("MEMORY_INDEX_TYPE", "auto")  # "flat", "hnsw", "ivf", "auto"
+    MEMORY_ANN_THRESHOLD = int(os.getenv("MEMORY_ANN_THRESHOLD", "20000"))  # auto 時に近似検索へ切り替える件数
+    MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.8"))  # 記憶として採用するコサイン類似度の下限（無関係な記憶同士でも 0.6 前後になるため、分布は examples/memory_dedup_report.py で確認）
+    MEMORY_VECTOR_STORAGE = os.getenv("MEMORY_VECTOR_STORAGE", "float32")  # "float32", "float16", "pq"
+    MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.97"))  # これ以上似た記憶は統合する
+    MEMORY_HYBRID_ENABLED = os.getenv("MEMORY_HYBRID_ENABLED", "true").lower() == "true"  # 文字 n-gram の BM25 検索を併用する
+    MEMORY_LEXICAL_MIN_SCORE = float(os.getenv("MEMORY_LEXICAL_MIN_SCORE", "0.5"))  # 類似度が低くても語彙一致で採用する BM25 スコアの比率（クエリの全索引語が一致した場合に対する割合、0〜1）
+    MEMORY_CONSOLIDATION_ENABLED = os.getenv("MEMORY_CONSOLIDATION_ENABLED", "true").lower() == "true"
+    MEMORY_CONSOLIDATION_INTERVAL = float(os.getenv("MEMORY_CONSOLIDATION_INTERVAL", "3600"))  # 秒
+    MEMORY_CONSOLIDATION_MIN_AGE_DAYS = float(os.getenv("MEMORY_CONSOLIDATION_MIN_AGE_DAYS", "7"))  # これより古い記憶を要約する
+    MEMORY_CONSOLIDATION_THRESHOLD = float(os.getenv("MEMORY_CONSOLIDATION_THRESHOLD", "0.88"))  # 同じ話題とみなす類似度
+    MEMORY_RETENTION_DAYS = float(os.getenv("MEMORY_RETENTION_DAYS", "0"))  # これより古い記憶は月別シャードに移す（0で無効。有効にすると初回の実行で古い記憶がまとめて移る）
+    
+    # 記憶検索の再ランキング（類似度 + 新しさ・話者・投稿者・参照頻度）
+    MEMORY_RERANK_ENABLED = os.getenv("MEMORY_RERANK_ENABLED", "true").lower() == "true"
+    MEMORY_RERANK = {
+        "overfetch": int(os.getenv("MEMORY_RERANK_OVERFETCH", "4")),
+        "similarity": float(os.getenv("MEMORY_RERANK_SIMILARITY_WEIGHT", "1.0")),
+        "relevance": float(os.getenv("MEMORY_RERANK_RELEVANCE_WEIGHT", "0.2")),
+        "recency": float(os.getenv("MEMORY_RERANK_RECENCY_WEIGHT", "0.2")),
+        "recency_half_life_hours": float(os.getenv("MEMORY_RERANK_HALF_LIFE_HOURS", "72")),
+        "frequency": float(os.getenv("MEMORY_RERANK_FREQUENCY_WEIGHT", "0.05")),
+        "author": float(os.getenv("MEMORY_RERANK_AUTHOR_WEIGHT", "0.1")),
+        "role_weights": {
+            "user": float(os.getenv("MEMORY_RERANK_USER_WEIGHT", "0.05")),
+            "assistant": float(os.getenv("MEMORY_RERANK_ASSISTANT_WEIGHT", "0.0")),
+            "summary": float(os.getenv("MEMORY_RERANK_SUMMARY_WEIGHT", "0.1"))
+        }
+    }
     
     # Comment Scoring
     THRESHOLD = 0.0  # コメントスコアリングの閾値
     
+    # コメントの処理順（重み付き和 + 待ち時間による加点の高い順）
+    COMMENT_PRIORITY_WEIGHTS = {
+        "score": float(os.getenv("COMMENT_PRIORITY_SCORE_WEIGHT", "1.0")),
+        "super_chat": float(os.getenv("COMMENT_PRIORITY_SUPER_CHAT_WEIGHT", "3.0")),
+        "member": float(os.getenv("COMMENT_PRIORITY_MEMBER_WEIGHT", "0.5")),
+        "voice": float(os.getenv("COMMENT_PRIORITY_VOICE_WEIGHT", "5.0")),
+        "high": float(os.getenv("COMMENT_PRIORITY_HIGH_WEIGHT", "1.0")),
+        "aging": float(os.getenv("COMMENT_PRIORITY_AGING_PER_SECOND", "0.02"))
+    }
+    COMMENT_MAX_AGE = float(os.getenv("COMMENT_MAX_AGE", "60"))  # 投稿からこの秒数を過ぎたコメントは処理しない
+    COMMENT_QUEUE_MAX_DEPTH = int(os.getenv("COMMENT_QUEUE_MAX_DEPTH", "30"))  # 溜めておくコメントの最大件数
+    CONTINUATION_IDLE_SECONDS = float(os.getenv("CONTINUATION_IDLE_SECONDS", "2"))  # 発話が終わってからコメントがなければ継続応答するまでの秒数
+    CONTINUATION_VOICE_QUIET_SECONDS = float(os.getenv("CONTINUATION_VOICE_QUIET_SECONDS", "10"))  # ハイブリッドモードで音声入力の後に継続応答を控える秒数
+    
     # Voice Model Settings
     VOICE_MODEL = {
         "bert": {
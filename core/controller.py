@@ -4,21 +4,27 @@
 import asyncio
 from typing import Optional
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from .comment_listener import CommentListener
 from .voice_listener import VoiceListener
 from .scorer import CommentScorer
+from .comment_scheduler import CommentScheduler
 from .memory_search import MemorySearcher
 from .prompt_builder import PromptBuilder
 from .responder import Responder
 from .vts_animator import VTSAnimator
 from .obs_connector import OBSConnector
 from .history_manager import HistoryManager
+from .memory_summarizer import MemorySummarizer
 from .models import Comment
 from utils.logger import get_logger
 from core.config import Config
 from memory.hipporag_memory import VTuberMemory
+from memory.consolidation import MemoryConsolidator
+from memory.shards import MemoryRetention
+from memory.reranker import RerankWeights
+from memory.sqlite_store import SQLiteStore
 import torch
 from .speech import Speak
 import time
@@ -30,19 +36,62 @@ class AIVTuberController:
     
     def __init__(self):
         """初期化"""
-        # Producer–Consumer 共有キュー
-        self._comment_queue: asyncio.Queue = asyncio.Queue()
-        
         self.scorer = CommentScorer()
-        self.memory_searcher = MemorySearcher()
+        
+        # Producer–Consumer 共有キュー（スコア・スーパーチャット・メンバー・音声入力と待ち時間で優先度順に取り出す）
+        # 古いコメントと溜まりすぎたコメントは捨てる
+        self._comment_queue: CommentScheduler = CommentScheduler(
+            scorer=self.scorer.score_comment,
+            weights=Config.COMMENT_PRIORITY_WEIGHTS,
+            max_age=Config.COMMENT_MAX_AGE,
+            max_depth=Config.COMMENT_QUEUE_MAX_DEPTH
+        )
+        
+        # 会話履歴・記憶のメタデータ・トリプルを SQLite に保存する場合は1つの DB を共有する
+        self.store = SQLiteStore(Path(Config.SQLITE_PATH)) if Config.STORAGE_BACKEND == "sqlite" else None
+        self.memory_searcher = MemorySearcher(store=self.store)
         self.history = HistoryManager(
             max_turns=Config.MAX_HISTORY_TURNS,
             persist_dir=Path(Config.HISTORY_DIR),
-            backup_dir=Path(Config.BACKUPS_DIR)
+            backup_dir=Path(Config.BACKUPS_DIR),
+            backup_retention=Config.HISTORY_BACKUP_RETENTION,
+            store=self.store
         )
         
         # --- HippoRAG 長期記憶を初期化 ---
-        self.memory = VTuberMemory(model_name="cl-nagoya/sup-simcse-ja-large", use_gpu=torch.cuda.is_available())
+        self.memory = VTuberMemory(
+            model_name="cl-nagoya/sup-simcse-ja-large",
+            use_gpu=torch.cuda.is_available(),
+            cache_size=Config.MEMORY_QUERY_CACHE_SIZE,
+            cache_ttl=Config.MEMORY_QUERY_CACHE_TTL,
+            index_type=Config.MEMORY_INDEX_TYPE,
+            ann_threshold=Config.MEMORY_ANN_THRESHOLD,
+            min_similarity=Config.MEMORY_MIN_SIMILARITY,
+            vector_storage=Config.MEMORY_VECTOR_STORAGE,
+            dedup_threshold=Config.MEMORY_DEDUP_THRESHOLD,
+            rerank_weights=RerankWeights.from_dict(Config.MEMORY_RERANK) if Config.MEMORY_RERANK_ENABLED else None,
+            hybrid=Config.MEMORY_HYBRID_ENABLED,
+            lexical_min_score=Config.MEMORY_LEXICAL_MIN_SCORE,
+            store=self.store
+        )
+        
+        # 古い記憶を要約に置き換える統合ジョブ
+        self.consolidator = MemoryConsolidator(
+            self.memory,
+            MemorySummarizer(),
+            min_age=timedelta(days=Config.MEMORY_CONSOLIDATION_MIN_AGE_DAYS),
+            similarity_threshold=Config.MEMORY_CONSOLIDATION_THRESHOLD,
+            interval=Config.MEMORY_CONSOLIDATION_INTERVAL
+        )
+        self._consolidation_task: Optional[asyncio.Task] = None
+        
+        # 保持期間を過ぎた記憶を月別のコールドシャードに移すジョブ（0日で無効）
+        self.retention = MemoryRetention(
+            self.memory,
+            retention=timedelta(days=Config.MEMORY_RETENTION_DAYS),
+            interval=Config.MEMORY_CONSOLIDATION_INTERVAL
+        ) if Config.MEMORY_RETENTION_DAYS > 0 else None
+        self._retention_task: Optional[asyncio.Task] = None
         
         self.prompt_builder = PromptBuilder(
             self.history,
@@ -58,7 +107,10 @@ class AIVTuberController:
         self.is_running = False
         self._listener = None
         self._voice_listener: Optional[VoiceListener] = None
-        self._is_comment_processing = True  # コメント処理状態フラグ
+        self._comment_processing = asyncio.Event()  # コメント処理中はセット、一時停止中はクリア
+        self._comment_processing.set()
+        self._comment_paused = asyncio.Event()  # 一時停止中はセット（待機中の Consumer を起こす）
+        self._consumer_task: Optional[asyncio.Task] = None
         
         # 音声認識関連
         self.operation_mode = Config.OPERATION_MODE  # "chat", "voice", "hybrid"
@@ -98,7 +150,10 @@ class AIVTuberController:
             asyncio.create_task(self._listener.start())   # Producer 起動
             
             # --- Consumer タスク：コメント処理メインループ ---
-            asyncio.create_task(self._consume_comments())  # Consumer 起動
+            self._start_consumer()
+            
+            # 記憶の統合ジョブ
+            self._start_consolidation()
             
             # 発話処理を開始
             await self.speak.start()
@@ -126,7 +181,10 @@ class AIVTuberController:
             await self._voice_listener.start()
             
             # コメント処理ループを開始
-            asyncio.create_task(self._consume_comments())
+            self._start_consumer()
+            
+            # 記憶の統合ジョブ
+            self._start_consolidation()
             
             # 発話処理を開始
             await self.speak.start()
@@ -163,6 +221,22 @@ class AIVTuberController:
             self.is_running = False
             raise
     
+    def _start_consumer(self) -> None:
+        """コメント処理ループを開始する（未起動の場合のみ）"""
+        if self._consumer_task and not self._consumer_task.done():
+            return
+        self._consumer_task = asyncio.create_task(self._consume_comments())
+    
+    def _start_consolidation(self) -> None:
+        """記憶の統合ジョブとアーカイブジョブを開始する（有効かつ未起動の場合のみ）"""
+        if self.retention and not (self._retention_task and not self._retention_task.done()):
+            self._retention_task = asyncio.create_task(self.retention.run_forever())
+        if not Config.MEMORY_CONSOLIDATION_ENABLED:
+            return
+        if self._consolidation_task and not self._consolidation_task.done():
+            return
+        self._consolidation_task = asyncio.create_task(self.consolidator.run_forever())
+    
     async def stop(self) -> None:
         """配信を停止する"""
         self.is_running = False
@@ -173,9 +247,32 @@ class AIVTuberController:
         if self._voice_listener:
             await self._voice_listener.stop()
         
+        # コメント処理ループを停止（イベント待ちの間も止まるようにキャンセルする）
+        if self._consumer_task:
+            self._consumer_task.cancel()
+            try:
+                await self._consumer_task
+            except asyncio.CancelledError:
+                pass
+            self._consumer_task = None
+        
         # 発話処理を停止
         await self.speak.stop()
         
+        # 記憶の統合・アーカイブジョブを停止
+        if self._consolidation_task:
+            self._consolidation_task.cancel()
+            self._consolidation_task = None
+        if self._retention_task:
+            self._retention_task.cancel()
+            self._retention_task = None
+        
+        # 未書き込みの長期記憶を保存
+        await self.memory.aflush()
+        
+        # 未書き込みの会話履歴を保存（ファイル I/O はイベントループの外で行う）
+        await asyncio.get_running_loop().run_in_executor(None, self.history.close)
+        
         logger.info(f"{self.operation_mode}モードを停止しました")
     
     async def _speak(self, text: str) -> None:
@@ -188,56 +285,114 @@ class AIVTuberController:
         await self.speak.add_speech(text)
     
     async def _consume_comments(self):
-        """Queue からコメントを取り出して順次処理する Consumer ループ"""
+        """
+        Queue からコメントを取り出して順次処理する Consumer ループ
+
+        コメントの到着・発話の終了・一時停止と再開をイベントとして待ち、
+        発話が終わってからコメントのないまま一定時間経てば継続応答を生成する。
+        """
         while self.is_running:
             try:
-                # コメント処理が一時停止中の場合は待機
-                if not self._is_comment_processing:
-                    await asyncio.sleep(1)
-                    continue
+                # コメント処理が一時停止中の場合は再開を待つ
+                await self._comment_processing.wait()
 
-                # 発話キューが満杯の場合はスキップ
-                if self.speak._queue.full():
-                    logger.warning("発話キューが満杯のため、コメントをスキップしました")
-                    if not self._comment_queue.empty():
-                        self._comment_queue.task_done()
-                    await asyncio.sleep(0.1)
+                # 発話キューが満杯の場合は空くまで次の応答を作らない
+                if self.speak.is_full():
+                    await self.speak.wait_until_idle()
                     continue
 
-                # コメントがある場合は優先的に処理
-                if not self._comment_queue.empty():
-                    comment = await self._comment_queue.get()
-                    
-                    # ハイブリッドモードで音声入力の場合は最優先処理
-                    if self.operation_mode == "hybrid" and comment.source == "voice":
-                        self.voice_detected = True
-                        self.last_voice_time = time.time()
-                        # 他のコメントをスキップする場合はここで処理
-                        
-                    await self._handle_comment(comment)
-                    logger.info(f"コメントを処理しました ({comment.source})") #debug
-                    self._comment_queue.task_done()
-                    continue
+                # 期限切れのコメントは先に捨てる
+                self._comment_queue.drop_stale()
+                event, comment = await self._wait_for_work()
+
+                if event == "comment":
+                    try:
+                        # ハイブリッドモードで音声入力の場合は最優先処理
+                        if self.operation_mode == "hybrid" and comment.source == "voice":
+                            self.voice_detected = True
+                            self.last_voice_time = time.time()
 
-                # コメントがなく、発話中でない場合のみ継続応答を生成
-                if not self.speak.is_speaking() and not self.speak._queue.full():
-                    # ハイブリッドモードの場合、音声入力から一定時間経過していることを確認
-                    if self.operation_mode == "hybrid":
-                        time_since_voice = time.time() - self.last_voice_time
-                        if time_since_voice < 10:  # 音声入力から10秒以内は継続応答を控える
-                            await asyncio.sleep(1)
-                            continue
-                    
+                        await self._handle_comment(comment)
+                        self._comment_queue.record_served(comment)
+                        logger.info(f"コメントを処理しました ({comment.source})") #debug
+                    finally:
+                        self._comment_queue.task_done()
+
+                elif event == "idle":
                     await self._generate_continuation_response()
                     logger.info("継続応答を生成しました") #debug
-                
-                await asyncio.sleep(2)
 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.exception(e)
-                if not self._comment_queue.empty():
-                    self._comment_queue.task_done()
-    
+
+    def _continuation_delay(self) -> float:
+        """発話が終わってから継続応答を生成するまでの秒数"""
+        delay = Config.CONTINUATION_IDLE_SECONDS
+        if self.operation_mode == "hybrid":
+            # 音声入力から一定時間は継続応答を控える
+            quiet = Config.CONTINUATION_VOICE_QUIET_SECONDS - (time.time() - self.last_voice_time)
+            delay = max(delay, quiet)
+        return delay
+
+    async def _wait_for_work(self):
+        """
+        次にすべきことを待つ
+
+        Returns:
+            tuple: ("comment", コメント) / ("idle", None)（継続応答する）/ ("paused", None)（一時停止された）
+        """
+        get_task = asyncio.ensure_future(self._comment_queue.get())
+        paused_task = asyncio.ensure_future(self._comment_paused.wait())
+        idle_task = None
+
+        def dequeued() -> bool:
+            return get_task.done() and not get_task.cancelled() and get_task.exception() is None
+
+        def check():
+            nonlocal paused_task
+            # 一時停止を先に確認する（同時に取り出したコメントは処理せずキューに戻す）
+            if self._comment_paused.is_set():
+                if dequeued():
+                    self._comment_queue.requeue(get_task.result())
+                return "paused", None
+            if paused_task.done():
+                # 一時停止の直後に再開された場合は待ち直す
+                paused_task = asyncio.ensure_future(self._comment_paused.wait())
+            if dequeued():
+                return "comment", get_task.result()
+            return None
+
+        try:
+            while True:
+                # 発話の終了待ちは終わるまで使い回す（待つたびに作るとタスクが溜まる）
+                if idle_task is None or idle_task.done():
+                    idle_task = asyncio.ensure_future(self.speak.wait_until_idle())
+                await asyncio.wait({get_task, paused_task, idle_task}, return_when=asyncio.FIRST_COMPLETED)
+                result = check()
+                if result:
+                    return result
+                if not idle_task.done():
+                    # 一時停止の直後に再開された場合など、発話が終わる前に起こされたら待ち直す
+                    continue
+
+                # 発話が終わったらアイドルタイマーを開始し、その間にコメントが来なければ継続応答
+                await asyncio.wait({get_task, paused_task}, timeout=self._continuation_delay(),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                result = check()
+                if result:
+                    return result
+                if self.speak.is_idle():
+                    return "idle", None
+                # タイマーの間に発話が始まった場合は、その発話が終わるのを待ち直す
+        finally:
+            for task in (paused_task, idle_task):
+                if task and not task.done():
+                    task.cancel()
+            if not get_task.done():
+                get_task.cancel()
+
     async def _handle_comment(self, comment: Comment):
         """個別コメントを処理するロジック（スコアリング → GPT 応答 → TTS）"""
         score = self.scorer.score_comment(comment)
@@ -245,23 +400,24 @@ class AIVTuberController:
             return
             
         # プロンプトを構築（テーマを含める）
-        prompt = self.prompt_builder.build(
+        prompt = await self.prompt_builder.build(
             comment=f"{comment.author}: {comment.text}",
-            current_theme=self.current_theme
+            current_theme=self.current_theme,
+            author=comment.author
         )
         
         # 応答を生成
         response_text = await self.responder.generate_response(prompt)
 
-        # 長期記憶に追加
-        self.memory.add(f"{comment.author}: {comment.text}", {
-            "role": "user",
-            "timestamp": datetime.now().isoformat()
-        })
-        self.memory.add(response_text, {
-            "role": "assistant",
-            "timestamp": datetime.now().isoformat()
-        })
+        # 長期記憶に追加（コメントと応答を1回でエンコード・保存）
+        timestamp = datetime.now().isoformat()
+        await self.memory.aadd_many(
+            [f"{comment.author}: {comment.text}", response_text],
+            [
+                {"role": "user", "author": comment.author, "timestamp": timestamp},
+                {"role": "assistant", "reply_to": comment.author, "timestamp": timestamp}
+            ]
+        )
         
         # 履歴を更新
         self.history.append("user", f"{comment.author}: {comment.text}")
@@ -272,7 +428,7 @@ class AIVTuberController:
     async def _generate_continuation_response(self):
         """コメントがない場合の継続応答を生成"""
         try:
-            prompt = self.prompt_builder.build(
+            prompt = await self.prompt_builder.build(
                 comment="<system>直前の会話の内容を読み取り、自然に会話を展開してください。</system>",
                 current_theme=self.current_theme
             )
@@ -281,7 +437,7 @@ class AIVTuberController:
             response_text = await self.responder.generate_response(prompt)
             
             # 履歴を更新
-            self.memory.add(response_text, {"role": "assistant"})
+            await self.memory.aadd(response_text, {"role": "assistant", "timestamp": datetime.now().isoformat()})
             self.history.append("assistant", response_text)
             
             # 発話
@@ -292,17 +448,19 @@ class AIVTuberController:
 
     def pause_comment_processing(self) -> None:
         """コメント処理を一時停止する"""
-        self._is_comment_processing = False
+        self._comment_processing.clear()
+        self._comment_paused.set()
         logger.info("コメント処理を一時停止しました")
 
     def resume_comment_processing(self) -> None:
         """コメント処理を再開する"""
-        self._is_comment_processing = True
+        self._comment_paused.clear()
+        self._comment_processing.set()
         logger.info("コメント処理を再開しました")
 
     def is_comment_processing(self) -> bool:
         """コメント処理状態を取得する"""
-        return self._is_comment_processing
+        return self._comment_processing.is_set()
     
     def set_operation_mode(self, mode: str) -> None:
         """
@@ -318,6 +476,10 @@ class AIVTuberController:
         self.voice_priority_mode = (mode == "hybrid")
         logger.info(f"動作モードを{mode}に設定しました")
     
+    def get_comment_queue_status(self) -> dict:
+        """コメントキューの状態（待ち件数・処理件数・破棄件数・応答までの秒数）を取得する"""
+        return self._comment_queue.stats()
+    
     def get_voice_status(self) -> dict:
         """音声認識の状態を取得する"""
         if self._voice_listener:
@@ -0,0 +1,181 @@
+"""
+会話履歴の増分バックアップ
+"""
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class HistoryBackup:
+    """
+    前回のバックアップ以降に追加された会話だけを保存する増分バックアップ
+
+    各バックアップの差分は内容の SHA-256 をファイル名にしたセグメントとして保存し
+    （同じ内容は1つのファイルを共有する）、backup_index.jsonl に時点ごとの
+    通し番号の範囲を記録する。ある時点の履歴は、その時点から遡って
+    max_turns 件分のセグメントをつなげて復元する。
+    """
+
+    def __init__(self, backup_dir: Path, max_turns: int = 1000, retention: int = 200):
+        """
+        初期化
+
+        Args:
+            backup_dir: バックアップを置くディレクトリ
+            max_turns: 復元する会話の最大件数（HistoryManager の保持件数）
+            retention: 復元できるように残すバックアップの時点数
+        """
+        self.backup_dir = Path(backup_dir)
+        self.segments_dir = self.backup_dir / "segments"
+        self.index_file = self.backup_dir / "backup_index.jsonl"
+        self.max_turns = max_turns
+        self.retention = retention
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.entries = self._load_index()
+
+    def _load_index(self) -> List[Dict[str, Any]]:
+        """バックアップの一覧を読み込む（書き込み途中の行は無視する）"""
+        entries = []
+        if self.index_file.exists():
+            with self.index_file.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return entries
+
+    @property
+    def last_seq(self) -> int:
+        """最後にバックアップした会話の通し番号"""
+        return self.entries[-1]["end_seq"] if self.entries else 0
+
+    def backup(self, turns: List[Dict[str, Any]], end_seq: int, base: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        前回のバックアップ以降の会話を保存する
+
+        Args:
+            turns: 前回のバックアップ以降に追加された会話（古い順、最後の1件の通し番号が end_seq）
+            end_seq: 最後の会話の通し番号
+            base: 履歴全体を置き換えた時点（復元時にこれより前のセグメントをつなげない）
+
+        Returns:
+            Optional[Dict[str, Any]]: 追加したバックアップの情報（新しい会話がなければ None）
+        """
+        if not turns or end_seq <= self.last_seq:
+            return None
+        start_seq = end_seq - len(turns) + 1
+
+        data = "".join(json.dumps(turn, ensure_ascii=False) + "\n" for turn in turns).encode("utf-8")
+        segment = hashlib.sha256(data).hexdigest()
+        segment_file = self.segments_dir / f"{segment}.jsonl"
+        if not segment_file.exists():
+            tmp_file = segment_file.with_name(segment_file.name + ".tmp")
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, segment_file)
+
+        entry = {
+            "created": datetime.datetime.now().isoformat(),
+            "start_seq": start_seq,
+            "end_seq": end_seq,
+            "segment": segment,
+            "base": base
+        }
+        with self.index_file.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.entries.append(entry)
+        self._apply_retention()
+        return entry
+
+    def _apply_retention(self):
+        """古い時点を削除し、残した時点の復元に不要になったセグメントを消す"""
+        if len(self.entries) <= self.retention:
+            return
+        oldest = self.entries[-self.retention]
+        # 残す最古の時点から max_turns 件遡った範囲に掛からないセグメントは不要
+        needed_from = oldest["end_seq"] - self.max_turns + 1
+        kept = [entry for entry in self.entries if entry["end_seq"] >= needed_from]
+        if len(kept) == len(self.entries):
+            return
+        referenced = {entry["segment"] for entry in kept}
+        removed = [entry for entry in self.entries if entry["segment"] not in referenced]
+
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        with tmp_file.open("w", encoding="utf-8") as f:
+            for entry in kept:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_file, self.index_file)
+        self.entries = kept
+
+        for segment in {entry["segment"] for entry in removed}:
+            (self.segments_dir / f"{segment}.jsonl").unlink(missing_ok=True)
+
+    def _chain(self, position: int) -> List[Dict[str, Any]]:
+        """
+        指定した時点の履歴の復元に使うバックアップ（古い順）
+
+        Raises:
+            ValueError: 復元に必要なセグメントが欠けている場合（保持期間を過ぎて削除済みなど）
+        """
+        if not self.entries:
+            raise ValueError("No history backups")
+        target = self.entries[position]
+        needed_from = max(1, target["end_seq"] - self.max_turns + 1)
+        # 対象の時点以前で最後に履歴全体を置き換えた時点から積み上げる
+        start = 0
+        for i, entry in enumerate(self.entries):
+            if entry["end_seq"] > target["end_seq"]:
+                break
+            if entry.get("base"):
+                start = i
+        chain = []
+        for entry in self.entries[start:]:
+            if entry["end_seq"] > target["end_seq"]:
+                break
+            if entry["end_seq"] >= needed_from:
+                chain.append(entry)
+
+        # 先頭が起点でなければ max_turns 件分を遡れること、各セグメントが連続して残っていることを確認する
+        first = chain[0]
+        if not first.get("base") and first["start_seq"] > needed_from:
+            raise ValueError(f"会話 {needed_from}〜{first['start_seq'] - 1} のバックアップは削除済みです")
+        for previous, entry in zip(chain, chain[1:]):
+            if entry["start_seq"] != previous["end_seq"] + 1:
+                raise ValueError(f"会話 {previous['end_seq'] + 1}〜{entry['start_seq'] - 1} のバックアップがありません")
+        for entry in chain:
+            if not (self.segments_dir / f"{entry['segment']}.jsonl").exists():
+                raise ValueError(f"セグメント {entry['segment']} がありません")
+        return chain
+
+    def is_restorable(self, position: int) -> bool:
+        """指定した時点の履歴を max_turns 件分欠けずに復元できるか"""
+        try:
+            self._chain(position)
+        except ValueError:
+            return False
+        return True
+
+    def restore(self, position: int = -1) -> Dict[str, Any]:
+        """
+        指定した時点の履歴を復元する
+
+        Args:
+            position: entries の位置（既定は最新）
+
+        Returns:
+            Dict[str, Any]: chat_history.json と同じ形式の {"turns": [...], "seq": 通し番号}
+
+        Raises:
+            ValueError: 復元に必要なセグメントが欠けている場合（途中までの履歴は返さない）
+        """
+        chain = self._chain(position)
+        turns: List[Dict[str, Any]] = []
+        for entry in chain:
+            with (self.segments_dir / f"{entry['segment']}.jsonl").open("r", encoding="utf-8") as f:
+                turns.extend(json.loads(line) for line in f if line.strip())
+        return {"turns": turns[-self.max_turns:], "seq": chain[-1]["end_seq"]}
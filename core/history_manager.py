@@ -1,66 +1,288 @@
 from collections import deque
 from pathlib import Path
-import json, datetime
-from utils.helpers import create_backup
+import atexit, json, datetime, os, threading, time
+from itertools import islice
+from core.history_backup import HistoryBackup
+from memory.sqlite_store import SQLiteStore
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（日本語などの非 ASCII 文字は1文字1トークン、ASCII は4文字で1トークン）"""
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
 class HistoryManager:
     """Store recent dialogue turns in memory and disk."""
 
-    def __init__(self, max_turns: int = 1000, persist_dir: Path | None = None, backup_dir: Path | None = None):
+    def __init__(self, max_turns: int = 1000, persist_dir: Path | None = None, backup_dir: Path | None = None,
+                 snapshot_interval: int = 200, backup_retention: int = 200, flush_window: float = 0.2,
+                 store: SQLiteStore | None = None):
         self.turns = deque(maxlen=max_turns)
+        self.store = store  # 指定した場合は JSON ファイルの代わりに SQLite に保存する
         self.persist_dir = persist_dir
         self.backup_dir = backup_dir
         self.backup_counter = 0
-        self.backup_interval = 10  # 10回の会話ごとにバックアップ
+        self.backup_interval = 10  # 10回の会話ごとにバックアップ（前回以降の差分のみ）
+        self.backup = HistoryBackup(backup_dir, max_turns=max_turns, retention=backup_retention) if backup_dir else None
+        self.snapshot_interval = snapshot_interval  # ジャーナルがこの件数に達したらスナップショットに統合
+        self._seq = 0  # これまでに追加した会話の通し番号
+        self._journal_count = 0
+        self._journal = None
+        # 書き込みはバックグラウンドスレッドで行い、flush_window 秒以内の追加を1回にまとめる
+        self.flush_window = flush_window
+        self._pending: list[dict] = []  # まだジャーナルに書いていない会話（seq 付き）
+        self._backup_due = False
+        self._lock = threading.Lock()  # 会話の追加と書き込み対象の取り出し
+        self._io_lock = threading.Lock()  # ファイルへの書き込み
+        self._wakeup = threading.Event()
+        self._writer: threading.Thread | None = None
+        self._closed = False
+        self._render_cache: dict = {}  # 直近の会話を整形した文字列（追加のたびに破棄）
         
         if persist_dir:
             persist_dir.mkdir(parents=True, exist_ok=True)
             self.history_file = persist_dir / "chat_history.json"
+            self.journal_file = persist_dir / "chat_history.jsonl"  # スナップショット以降の追記分
             self._load_history()
+            atexit.register(self.close)
 
     def _load_history(self):
-        """履歴を読み込む"""
+        """履歴を読み込む（SQLite の場合は直近 max_turns 件だけを読む）"""
+        if self.store and self.store.history_count():
+            records = self.store.last_turns(self.turns.maxlen)
+            self._seq = records[-1]["seq"] if records else 0
+            self.turns = deque(({k: v for k, v in r.items() if k != "seq"} for r in records), maxlen=self.turns.maxlen)
+        else:
+            self._load_json_history()
+            if self.store and self.turns:
+                # 初回は JSON の履歴を取り込む
+                first = self._seq - len(self.turns) + 1
+                self.store.append_turns([{**turn, "seq": first + i} for i, turn in enumerate(self.turns)])
+        self.backup_counter = self._seq % self.backup_interval
+
+    def _load_json_history(self):
+        """履歴を読み込む（スナップショット + ジャーナルの末尾 max_turns 件）"""
+        snapshot_seq = 0
         if self.history_file.exists():
             try:
                 with self.history_file.open("r", encoding="utf-8") as f:
                     data = json.load(f)
                     self.turns = deque(data.get("turns", []), maxlen=self.turns.maxlen)
-                    self.backup_counter = len(self.turns) % self.backup_interval
+                    snapshot_seq = data.get("seq", len(self.turns))
             except Exception as e:
                 logger.error(f"Error loading history: {e}")
+        self._seq = snapshot_seq
+
+        if self.journal_file.exists():
+            try:
+                with self.journal_file.open("rb") as f:
+                    data = f.read()
+                # 改行で終わっていない末尾は書き込み途中の行なので切り捨てる
+                valid_length = data.rfind(b"\n") + 1
+                if valid_length < len(data):
+                    logger.warning("Discarding incomplete trailing history record")
+                    with self.journal_file.open("r+b") as f:
+                        f.truncate(valid_length)
+                for line in data[:valid_length].decode("utf-8").splitlines():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._journal_count += 1
+                    seq = record.pop("seq", None)
+                    # スナップショット作成後、ジャーナルを空にする前に停止した場合の重複を除く
+                    if seq is not None and seq <= snapshot_seq:
+                        continue
+                    self.turns.append(record)
+                    self._seq = max(self._seq, seq or self._seq + 1)
+            except Exception as e:
+                logger.error(f"Error loading history journal: {e}")
 
     def _save_history(self):
-        """履歴を保存する"""
-        if self.persist_dir:
+        """履歴のスナップショットを保存し、ジャーナルを空にする（_io_lock 内で呼ぶ）"""
+        if self.persist_dir and not self.store:
+            with self._lock:
+                data = {"turns": list(self.turns), "seq": self._seq}
             try:
-                with self.history_file.open("w", encoding="utf-8") as f:
-                    json.dump({"turns": list(self.turns)}, f, ensure_ascii=False, indent=2)
+                tmp_file = self.history_file.with_name(self.history_file.name + ".tmp")
+                with tmp_file.open("w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.history_file)
+                # スナップショットより後に書かれるジャーナル行は seq で読み飛ばされるので重複しない
+                if self._journal:
+                    self._journal.truncate(0)
+                self._journal_count = 0
             except Exception as e:
                 logger.error(f"Error saving history: {e}")
 
+    def _append_journal(self, records: list[dict]):
+        """会話をまとめてジャーナルに追記する（書き込み量は履歴の長さによらず追加分のみ）"""
+        try:
+            if self._journal is None:
+                self._journal = self.journal_file.open("a", encoding="utf-8")
+            self._journal.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            self._journal.flush()
+            self._journal_count += len(records)
+        except Exception as e:
+            logger.error(f"Error appending history: {e}")
+
     def _create_backup(self):
-        """バックアップを作成する"""
-        if self.backup_dir and self.history_file.exists():
+        """前回のバックアップ以降に追加された会話をバックアップする（_io_lock 内で呼ぶ）"""
+        if self.backup:
             try:
-                create_backup(str(self.history_file), str(self.backup_dir))
-                logger.info("History backup created")
+                with self._lock:
+                    seq = self._seq
+                    count = min(seq - self.backup.last_seq, len(self.turns))
+                    turns = list(islice(reversed(self.turns), count))[::-1] if count > 0 else []
+                if not turns:
+                    return
+                self.backup.backup(turns, seq)
+                logger.info(f"History backup created ({count} turns)")
             except Exception as e:
                 logger.error(f"Error creating backup: {e}")
 
     def append(self, role: str, text: str):
-        """会話を追加"""
-        self.turns.append({"role": role, "text": text, "ts": datetime.datetime.now().isoformat()})
-        self._save_history()
-        
-        # バックアップカウンターを更新
-        self.backup_counter = (self.backup_counter + 1) % self.backup_interval
-        if self.backup_counter == 0:
-            self._create_backup()
+        """会話を追加（ファイルへの書き込みはバックグラウンドで行う）"""
+        turn = {"role": role, "text": text, "ts": datetime.datetime.now().isoformat()}
+        with self._lock:
+            self.turns.append(turn)
+            self._seq += 1
+            self._render_cache.clear()
+            if self.persist_dir:
+                self._pending.append({**turn, "seq": self._seq})
+            
+            # バックアップカウンターを更新
+            self.backup_counter = (self.backup_counter + 1) % self.backup_interval
+            if self.backup_counter == 0:
+                self._backup_due = True
+
+        if self.persist_dir:
+            self._start_writer()
+            self._wakeup.set()
+
+    def _start_writer(self):
+        """書き込みスレッドを起動する（close 後に再び追加された場合も再起動する）"""
+        if self._writer and self._writer.is_alive():
+            return
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                break
+            # 直後に続く追加（コメントと応答の2件など）を待ってからまとめて書く
+            time.sleep(self.flush_window)
+            self.flush()
+
+    def flush(self):
+        """未書き込みの会話をジャーナルに書き出す（必要ならスナップショットとバックアップも作る）"""
+        if not self.persist_dir:
+            return
+        with self._io_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+                backup_due, self._backup_due = self._backup_due, False
+            if records and self.store:
+                try:
+                    self.store.append_turns(records)
+                except Exception as e:
+                    logger.error(f"Error appending history: {e}")
+            elif records:
+                self._append_journal(records)
+            if self._journal_count >= self.snapshot_interval:
+                self._save_history()
+            if backup_due:
+                self._create_backup()
+
+    def close(self):
+        """書き込みスレッドを止め、ジャーナルをスナップショットに統合して閉じる"""
+        if not self.persist_dir:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._writer:
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        with self._io_lock:
+            self._save_history()
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+
+    def query_turns(self, start: str | None = None, end: str | None = None, role: str | None = None,
+                    limit: int = 1000) -> list[dict]:
+        """
+        期間（ISO 形式の start 以上 end 未満）と話者で会話を検索する
+
+        SQLite の場合は保持件数より古い会話もインデックスで検索する。
+        """
+        if self.store:
+            self.flush()
+            return self.store.query_turns(start, end, role, limit)
+        with self._lock:
+            return [
+                turn for turn in self.turns
+                if (start is None or turn["ts"] >= start) and (end is None or turn["ts"] < end)
+                and (role is None or turn["role"] == role)
+            ][:limit]
+
+    def iter_last_n(self, n: int = 10):
+        """直近 n 件の会話を古い順に返す（末尾の n 件だけをたどり、履歴全体はコピーしない）"""
+        with self._lock:
+            selected = list(islice(reversed(self.turns), n))
+        return reversed(selected)
+
+    @staticmethod
+    def _format_turn(turn: dict) -> str:
+        return f"{turn['role']}: {turn['text']}"
 
     def get_last_n_turns(self, n: int = 10) -> str:
         """Return the last *n* turns as a newline‑joined string: 'user: ...' """
-        selected = list(self.turns)[-n:]
-        return "\n".join(f"{t['role']}: {t['text']}" for t in selected) 
\ No newline at end of file
+        key = ("turns", n)
+        rendered = self._render_cache.get(key)
+        if rendered is None:
+            rendered = "\n".join(self._format_turn(t) for t in self.iter_last_n(n))
+            self._render_cache[key] = rendered
+        return rendered
+
+    def get_recent_within_tokens(self, max_tokens: int, max_turns: int | None = None) -> str:
+        """
+        トークン数の上限に収まる直近の会話を整形して返す
+
+        新しい会話から順に、上限を超える直前までを採用する（最新の1件が上限を
+        超える場合も末尾を切り詰めて含める）。
+
+        Args:
+            max_tokens: トークン数の上限（estimate_tokens による概算）
+            max_turns: 会話件数の上限（None の場合は件数で制限しない）
+
+        Returns:
+            str: 古い順に改行で連結した会話
+        """
+        key = ("tokens", max_tokens, max_turns)
+        rendered = self._render_cache.get(key)
+        if rendered is not None:
+            return rendered
+
+        lines = []
+        used = 0
+        with self._lock:
+            for turn in islice(reversed(self.turns), max_turns):
+                line = self._format_turn(turn)
+                tokens = estimate_tokens(line) + 1  # 改行の分
+                if used + tokens > max_tokens:
+                    if not lines:
+                        lines.append(line[-max_tokens:])
+                    break
+                lines.append(line)
+                used += tokens
+        rendered = "\n".join(reversed(lines))
+        self._render_cache[key] = rendered
+        return rendered
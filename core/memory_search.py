@@ -3,9 +3,11 @@
 """
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from .models import MemoryItem
+from memory.lexical_index import BM25Index
+from memory.sqlite_store import SQLiteStore
 from utils.logger import get_logger
 from core.config import Config
 
@@ -14,8 +16,14 @@ logger = get_logger(__name__)
 class MemorySearcher:
     """メモリ検索クラス"""
     
-    def __init__(self):
-        """初期化"""
+    def __init__(self, store: Optional[SQLiteStore] = None):
+        """
+        初期化
+        
+        Args:
+            store: SQLite ストア（指定した場合は memories.json の代わりに SQLite にトリプルを保存する）
+        """
+        self.store = store
         self.hipporag_dir = Config.HIPPORAG_DIR
         if not os.path.exists(self.hipporag_dir):
             os.makedirs(self.hipporag_dir)
@@ -23,8 +31,23 @@ class MemorySearcher:
         # メモリファイルのパス
         self.memory_file = os.path.join(self.hipporag_dir, "memories.json")
         
+        # 文字 n-gram の転置インデックス（トリプルのリスト上の位置、SQLite の場合はトリプルの ID を文書IDとする）
+        self.lexical_index = BM25Index()
+
+        if self.store:
+            # 初回は memories.json の内容を取り込む（以降は起動時に読み込まない）
+            if not self.store.triple_count() and os.path.exists(self.memory_file):
+                self.store.import_triples(self._load_memories()["triples"])
+            self.memories = None
+            # 検索は JSON の場合と同じ BM25Index で行う（SQLite からは本文だけを読む）
+            for row in self.store.triple_texts():
+                self.lexical_index.add(row["id"], row["text"])
+            return
+
         # メモリの読み込み
         self.memories = self._load_memories()
+        for i, triple in enumerate(self.memories["triples"]):
+            self.lexical_index.add(i, triple["text"])
     
     def _load_memories(self) -> Dict[str, Any]:
         """
@@ -57,27 +80,6 @@ class MemorySearcher:
         except Exception as e:
             logger.error(f"Error saving memories: {e}")
     
-    def _calculate_similarity(self, query: str, text: str) -> float:
-        """
-        テキストの類似度を計算する
-        
-        Args:
-            query: クエリテキスト
-            text: 比較するテキスト
-            
-        Returns:
-            float: 類似度（0-1）
-        """
-        # 単語の重複をカウント
-        query_words = set(query.lower().split())
-        text_words = set(text.lower().split())
-        
-        # Jaccard類似度を計算
-        intersection = len(query_words & text_words)
-        union = len(query_words | text_words)
-        
-        return intersection / union if union > 0 else 0.0
-    
     def search_memory(self, query: str, top_k: int = 5) -> List[MemoryItem]:
         """
         メモリを検索する
@@ -90,21 +92,24 @@ class MemorySearcher:
             List[MemoryItem]: メモリアイテムのリスト
         """
         try:
-            # 各メモリのスコアを計算
-            scored_memories = []
-            for triple in self.memories["triples"]:
-                score = self._calculate_similarity(query, triple["text"])
-                scored_memories.append(MemoryItem(
-                    triple=triple["triple"],
-                    text=triple["text"],
+            if self.store:
+                hits = self.lexical_index.search(query, top_k)
+                rows = self.store.get_triples([i for i, _ in hits])
+                return [
+                    MemoryItem(triple=rows[i]["triple"], text=rows[i]["text"], score=score)
+                    for i, score in hits if i in rows
+                ]
+
+            # BM25 で転置インデックスを引く（クエリの n-gram を含むメモリだけを採点する）
+            triples = self.memories["triples"]
+            return [
+                MemoryItem(
+                    triple=triples[i]["triple"],
+                    text=triples[i]["text"],
                     score=score
-                ))
-            
-            # スコアでソート
-            scored_memories.sort(key=lambda x: x.score, reverse=True)
-            
-            # 上位k件を返す
-            return scored_memories[:top_k]
+                )
+                for i, score in self.lexical_index.search(query, top_k)
+            ]
             
         except Exception as e:
             logger.error(f"Error searching memory: {e}")
@@ -119,12 +124,18 @@ class MemorySearcher:
             text: テキスト
         """
         try:
+            if self.store:
+                triple_id = self.store.add_triple(triple, text, datetime.now().isoformat())
+                self.lexical_index.add(triple_id, text)
+                return
+
             # 新しいメモリを追加
             self.memories["triples"].append({
                 "triple": triple,
                 "text": text,
                 "timestamp": datetime.now().isoformat()
             })
+            self.lexical_index.add(len(self.memories["triples"]) - 1, text)
             
             # メモリを保存
             self._save_memories()
@@ -135,10 +146,15 @@ class MemorySearcher:
     def clear_memories(self) -> None:
         """メモリをクリアする"""
         try:
+            if self.store:
+                self.store.clear_triples()
+                self.lexical_index.clear()
+                return
             self.memories = {
                 "triples": [],
                 "last_updated": datetime.now().isoformat()
             }
+            self.lexical_index.clear()
             self._save_memories()
         except Exception as e:
             logger.error(f"Error clearing memories: {e}") 
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+記憶要約モジュール
+"""
+from typing import List
+from openai import AsyncOpenAI
+from utils.logger import get_logger
+from core.config import Config
+
+logger = get_logger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "あなたはVTuberの長期記憶を整理するアシスタントです。"
+    "与えられた配信中の発言のまとまりから、後で思い出すべき事実"
+    "（視聴者の名前・好み・出来事・約束など）だけを、日本語で1〜3文に簡潔にまとめてください。"
+)
+
+class MemorySummarizer:
+    """OpenAI を使って記憶のまとまりを要約する"""
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        """初期化"""
+        self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+        self.model = model
+
+    async def summarize(self, texts: List[str]) -> str:
+        """
+        発言のまとまりを要約する
+
+        Args:
+            texts: 要約する発言のリスト
+
+        Returns:
+            str: 要約文（失敗した場合は空文字）
+        """
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": "\n".join(f"- {text}" for text in texts)}
+                ],
+                temperature=0.2,
+                max_tokens=200
+            )
+
+            return response.choices[0].message.content.strip()
+
+        except Exception as e:
+            logger.error(f"Error summarizing memories: {e}")
+            return ""
@@ -2,35 +2,58 @@
 プロンプトビルダーモジュール
 """
 from core.system_prompt_loader import SystemPromptLoader
+from core.config import Config
 from utils.logger import get_logger
 from memory.hipporag_memory import VTuberMemory
 from typing import Optional
+import asyncio
 
 logger = get_logger(__name__)
 
 class PromptBuilder:
     """プロンプトビルダー"""
     
-    def __init__(self, history_mgr, memory: VTuberMemory):
+    def __init__(self, history_mgr, memory: VTuberMemory, viewer_top_k: int = 3):
         self.history_mgr = history_mgr
         self.memory = memory
+        self.viewer_top_k = viewer_top_k  # 投稿者本人に関する記憶の最大件数
 
-    def build(self, *, comment: str, current_theme: Optional[str] = None) -> str:
+    async def build(self, *, comment: str, current_theme: Optional[str] = None,
+                    author: Optional[str] = None) -> str:
         """
         構造化されたプロンプトを構築する
         
         Args:
             comment: コメント
             current_theme: 現在の配信テーマ
+            author: コメントの投稿者（本人に関する記憶を優先して検索する）
             
         Returns:
             str: 構築されたプロンプト
         """
-        # 関連する記憶を検索
-        retrieved = self.memory.retrieve(comment)
-        rag_memory = "\n".join([f"【記憶{i+1}】{c} (記録日時: {self.memory.documents[i].metadata.get('timestamp', '不明')})" for i, c in enumerate(retrieved)])
+        # 関連する記憶を検索（埋め込み計算は専用スレッドで実行）
+        # 投稿者がわかる場合は、その視聴者に関する記憶も並行して検索する
+        if author:
+            retrieved, viewer_hits = await asyncio.gather(
+                self.memory.aretrieve(comment, author=author),
+                self.memory.aretrieve_author(comment, author, top_k=self.viewer_top_k)
+            )
+        else:
+            retrieved, viewer_hits = await self.memory.aretrieve(comment), []
+        # 類似度の下限未満の記憶は retrieve の時点で除かれている
+        rag_memory = "\n".join([f"【記憶{i+1}】{hit.text} (記録日時: {hit.metadata.get('timestamp', '不明')})" for i, hit in enumerate(retrieved)])
+
+        # 全体検索と重複しない記憶だけを視聴者の記憶として追加する
+        retrieved_ids = {hit.id for hit in retrieved}
+        viewer_hits = [hit for hit in viewer_hits if hit.id not in retrieved_ids]
+        if viewer_hits:
+            viewer_memory = "\n".join([f"【{author}さんの記憶{i+1}】{hit.text} (記録日時: {hit.metadata.get('timestamp', '不明')})" for i, hit in enumerate(viewer_hits)])
+            rag_memory = f"{rag_memory}\n{viewer_memory}" if rag_memory else viewer_memory
         
-        recent_history = self.history_mgr.get_last_n_turns(10)
+        # 直近の会話は件数とトークン数の両方で上限を設ける（整形結果は次の会話追加までキャッシュされる）
+        recent_history = self.history_mgr.get_recent_within_tokens(
+            Config.HISTORY_PROMPT_MAX_TOKENS, max_turns=Config.HISTORY_PROMPT_MAX_TURNS
+        )
 
         prompt = f"""
 <memory>
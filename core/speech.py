@@ -28,6 +28,8 @@ class Speak:
         self._obs_connector = OBSConnector()
         self._last_activity = None
         self._is_speaking = False  # 発話状態のフラグ
+        self._idle = asyncio.Event()  # 再生中でもキューに音声が残ってもいない間はセット
+        self._idle.set()
         
         # TTS関連の初期化
         self.device = Config.VOICE_MODEL["model"]["device"]
@@ -110,6 +112,7 @@ class Speak:
                 
                 # キューに追加（文と音声データをタプルとして保存）
                 await self._queue.put((sentence, sr, audio))
+                self._idle.clear()
                 self._last_activity = asyncio.get_event_loop().time()
                 
         except Exception as e:
@@ -140,17 +143,22 @@ class Speak:
                     
                     # タスク完了を通知
                     self._queue.task_done()
+                    if self._queue.empty():
+                        self._idle.set()
                     
                 except asyncio.CancelledError:
                     break
                 except Exception as e:
                     logger.error(f"音声再生エラー: {e}")
                     self._is_speaking = False
+                    if self._queue.empty():
+                        self._idle.set()
                     continue
                     
         finally:
             sd.stop()
             self._is_speaking = False
+            self._idle.set()
     
     async def _text_to_speech(self, text: str) -> tuple[int, np.ndarray]:
         """テキストを音声に変換して再生"""
@@ -178,4 +186,16 @@ class Speak:
     
     def is_speaking(self) -> bool:
         """発話状態を取得する"""
-        return self._is_speaking 
\ No newline at end of file
+        return self._is_speaking
+    
+    def is_idle(self) -> bool:
+        """再生中の音声もキューに残った音声もないかどうか"""
+        return self._idle.is_set()
+    
+    def is_full(self) -> bool:
+        """発話キューが満杯かどうか"""
+        return self._queue.full()
+    
+    async def wait_until_idle(self):
+        """再生中の音声とキューに残った音声がすべて終わるまで待つ"""
+        await self._idle.wait() 
\ No newline at end of file
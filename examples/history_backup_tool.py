@@ -0,0 +1,101 @@
+"""
+会話履歴のバックアップ一覧・復元ツール
+
+増分バックアップ（storage/history/backups/backup_index.jsonl）の任意の時点、
+または旧形式の完全コピー（chat_history.json_YYYYmmdd_HHMMSS.json）から
+chat_history.json を復元する。配信を停止した状態で実行すること。
+
+使い方:
+    python examples/history_backup_tool.py list
+    python examples/history_backup_tool.py restore --position -1
+    python examples/history_backup_tool.py restore --file storage/history/backups/chat_history.json_20250512_212409.json
+    python examples/history_backup_tool.py prune-legacy
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import Config
+from core.history_backup import HistoryBackup
+
+
+def legacy_backups(backup_dir: Path):
+    """旧形式の完全コピーのバックアップ（古い順）"""
+    return sorted(backup_dir.glob("chat_history.json_*.json"))
+
+
+def restore(history_dir: Path, backup: HistoryBackup, data: dict) -> None:
+    """
+    復元した履歴でスナップショットを置き換える
+
+    通し番号は最新のバックアップの続きにし、復元した履歴全体を
+    新しい起点（base）としてバックアップしておく。
+    """
+    turns = data["turns"]
+    seq = backup.last_seq + len(turns)
+    history_file = history_dir / "chat_history.json"
+    tmp_file = history_file.with_name(history_file.name + ".tmp")
+    with tmp_file.open("w", encoding="utf-8") as f:
+        json.dump({"turns": turns, "seq": seq}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, history_file)
+    (history_dir / "chat_history.jsonl").unlink(missing_ok=True)
+    backup.backup(turns, seq, base=True)
+    print(f"{len(turns)}件の会話を復元しました: {history_file}")
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="会話履歴のバックアップ一覧・復元ツール")
+    parser.add_argument("command", choices=["list", "restore", "prune-legacy"],
+                        help="list: 一覧 / restore: 復元 / prune-legacy: 旧形式の完全コピーを削除")
+    parser.add_argument("--position", type=int, default=-1, help="復元する増分バックアップの番号（list の # 列、既定は最新）")
+    parser.add_argument("--file", help="復元する旧形式のバックアップファイル")
+    parser.add_argument("--history-dir", default=Config.HISTORY_DIR, help="会話履歴のディレクトリ")
+    parser.add_argument("--backup-dir", default=Config.BACKUPS_DIR, help="バックアップのディレクトリ")
+    args = parser.parse_args()
+
+    history_dir = Path(args.history_dir)
+    backup_dir = Path(args.backup_dir)
+    backup = HistoryBackup(backup_dir, max_turns=Config.MAX_HISTORY_TURNS, retention=Config.HISTORY_BACKUP_RETENTION)
+
+    if args.command == "list":
+        # 保持期間を過ぎて古いセグメントが消えた時点は、他の時点の復元用に残っているだけなので表示しない
+        restorable = [i for i in range(len(backup.entries)) if backup.is_restorable(i)]
+        print(f"増分バックアップ: {len(restorable)}件")
+        for i in restorable:
+            entry = backup.entries[i]
+            mark = " (起点)" if entry.get("base") else ""
+            print(f"  #{i}: {entry['created']} 会話 {entry['start_seq']}〜{entry['end_seq']}{mark}")
+        legacy = legacy_backups(backup_dir)
+        if legacy:
+            size = sum(path.stat().st_size for path in legacy)
+            print(f"旧形式の完全コピー: {len(legacy)}件 ({size / 1024:.1f}KB)")
+            for path in legacy:
+                print(f"  {path}")
+
+    elif args.command == "restore":
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["turns"] = data.get("turns", [])[-Config.MAX_HISTORY_TURNS:]
+        else:
+            try:
+                data = backup.restore(args.position)
+            except (ValueError, IndexError) as e:
+                raise SystemExit(f"#{args.position} の時点は復元できません: {e}")
+        restore(history_dir, backup, data)
+
+    else:
+        legacy = legacy_backups(backup_dir)
+        for path in legacy:
+            path.unlink()
+        print(f"旧形式の完全コピーを{len(legacy)}件削除しました")
+
+
+if __name__ == "__main__":
+    main()
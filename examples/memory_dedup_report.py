@@ -0,0 +1,117 @@
+"""
+記憶の重複統合レポート
+
+memory_data の記憶に取り込み時と同じ重複判定（完全一致 + コサイン類似度）を
+記録順に適用した場合、何件が統合され、どれだけ容量が減るかを集計する。
+あわせて無作為な記憶のペアのコサイン類似度の分布を出し、類似度の閾値
+（MEMORY_MIN_SIMILARITY・MEMORY_CONSOLIDATION_THRESHOLD・MEMORY_DEDUP_THRESHOLD）を
+無関係なペアの何割が超えるかを確認する。データは書き換えない。
+
+使い方:
+    python examples/memory_dedup_report.py --threshold 0.97
+"""
+import argparse
+import json
+import os
+import sys
+
+import faiss
+import numpy as np
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import Config
+from memory.dedup import can_merge, dedup_key
+from memory.index_factory import normalize_vectors
+
+PERCENTILES = [5, 25, 50, 75, 95, 99]
+
+
+def report_similarity_distribution(vectors: np.ndarray, sample_pairs: int, seed: int = 0) -> None:
+    """
+    無作為な記憶のペアのコサイン類似度の分布と、各閾値を超えるペアの割合を表示する
+
+    埋め込みモデルは等方的ではない（sup-simcse-ja-large では無関係な文同士でも 0.6 前後になる）ため、
+    閾値はこの分布の上側に置く必要がある。
+    """
+    count = len(vectors)
+    if count < 2:
+        return
+    rng = np.random.default_rng(seed)
+    left = rng.integers(0, count, size=sample_pairs)
+    right = rng.integers(0, count - 1, size=sample_pairs)
+    right += right >= left  # 同じ記憶同士のペアを除く
+    similarities = np.einsum("ij,ij->i", vectors[left], vectors[right])
+
+    values = np.percentile(similarities, PERCENTILES)
+    print(f"無作為なペアのコサイン類似度 ({sample_pairs}組): 平均 {similarities.mean():.3f}, "
+          + ", ".join(f"p{p} {v:.3f}" for p, v in zip(PERCENTILES, values)))
+    for name, threshold in [("MEMORY_MIN_SIMILARITY", Config.MEMORY_MIN_SIMILARITY),
+                            ("MEMORY_CONSOLIDATION_THRESHOLD", Config.MEMORY_CONSOLIDATION_THRESHOLD),
+                            ("MEMORY_DEDUP_THRESHOLD", Config.MEMORY_DEDUP_THRESHOLD)]:
+        print(f"  {name}={threshold}: 無作為なペアの {(similarities >= threshold).mean() * 100:.1f}% が超える")
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="記憶の重複統合レポート")
+    parser.add_argument("--persist-dir", default="memory_data", help="記憶データのディレクトリ")
+    parser.add_argument("--threshold", type=float, default=0.97, help="ほぼ重複とみなすコサイン類似度")
+    parser.add_argument("--examples", type=int, default=5, help="表示する統合例の件数")
+    parser.add_argument("--sample-pairs", type=int, default=100000, help="類似度の分布を調べる無作為なペアの数")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.persist_dir, "documents.json"), "r", encoding="utf-8") as f:
+        documents = json.load(f)
+    vectors = normalize_vectors(np.load(os.path.join(args.persist_dir, "embeddings.npy")))
+    count = min(len(documents), len(vectors))
+
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    kept_metadata = []
+    kept_texts = []
+    text_keys = {}
+    exact = 0
+    near = 0
+    saved_json_bytes = 0
+    examples = []
+
+    for doc, vector in zip(documents[:count], vectors[:count]):
+        key = dedup_key(doc["page_content"])
+        meta = doc.get("metadata", {})
+
+        duplicate_of = text_keys.get(key)
+        if duplicate_of is not None and can_merge(kept_metadata[duplicate_of], meta):
+            exact += 1
+        else:
+            duplicate_of = None
+            if index.ntotal:
+                scores, indices = index.search(vector.reshape(1, -1), 1)
+                if scores[0][0] >= args.threshold and can_merge(kept_metadata[indices[0][0]], meta):
+                    duplicate_of = int(indices[0][0])
+                    near += 1
+                    if len(examples) < args.examples:
+                        examples.append((float(scores[0][0]), kept_texts[duplicate_of], doc["page_content"]))
+
+        if duplicate_of is not None:
+            saved_json_bytes += len(json.dumps(doc, ensure_ascii=False, indent=2).encode("utf-8"))
+            continue
+
+        text_keys[key] = index.ntotal
+        kept_metadata.append(meta)
+        kept_texts.append(doc["page_content"])
+        index.add(vector.reshape(1, -1))
+
+    merged = exact + near
+    vector_bytes = vectors.shape[1] * 4
+    print(f"記憶: {count}件 → {count - merged}件 (完全一致 {exact}件, ほぼ重複 {near}件を統合, 閾値 {args.threshold})")
+    print(f"削減量: documents.json 約{saved_json_bytes / 1024:.1f}KB, "
+          f"embeddings.npy / index.faiss 各{merged * vector_bytes / 1024:.1f}KB "
+          f"({merged / count * 100 if count else 0:.1f}%)")
+    for score, kept, dropped in examples:
+        print(f"  [{score:.3f}] {kept[:40]} ← {dropped[:40]}")
+    report_similarity_distribution(vectors[:count], args.sample_pairs)
+
+
+if __name__ == "__main__":
+    main()
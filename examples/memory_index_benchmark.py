@@ -0,0 +1,105 @@
+"""
+記憶インデックスのベンチマーク
+
+memory_data の埋め込みを使い、厳密検索（flat）と近似最近傍検索（hnsw / ivf）、
+およびベクトルの保存形式（float32 / float16 / pq）ごとに、構築時間・検索レイテンシ・
+インデックスサイズ・再現率（float32 の flat の結果に対する recall@k）を比較する。
+量子化した保存形式は記憶の検索と同じく、多めに取った候補を元の埋め込みで再計算してから上位を選ぶ。
+
+使い方:
+    python examples/memory_index_benchmark.py --scale 50 --top-k 5 --min-recall 0.9
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+
+import numpy as np
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from memory.index_factory import build_index, index_storage, normalize_vectors, resolve_storage, search_rescored
+
+
+def load_corpus(path: str, scale: int, seed: int) -> np.ndarray:
+    """埋め込みを読み込み、scale 倍にノイズ付きで複製して大規模な記憶を模擬する"""
+    base = normalize_vectors(np.load(path))
+    if scale <= 1:
+        return base
+    rng = np.random.default_rng(seed)
+    noise_scale = 0.3 / np.sqrt(base.shape[1])
+    copies = [base] + [base + rng.normal(0, noise_scale, base.shape).astype(np.float32) for _ in range(scale - 1)]
+    return normalize_vectors(np.vstack(copies))
+
+
+def benchmark(kind: str, storage: str, corpus: np.ndarray, queries: np.ndarray, top_k: int,
+              truth: np.ndarray | None):
+    """1種類のインデックスについて構築・検索時間と再現率を測る"""
+    start = time.perf_counter()
+    index = build_index(kind, corpus, storage=storage)
+    build_ms = (time.perf_counter() - start) * 1000
+    size_mb = len(faiss.serialize_index(index)) / 1024 / 1024
+
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = search_rescored(index, query.reshape(1, -1), top_k, lambda positions: corpus[positions])
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([position for position, _ in hits])
+    results = np.array(results)
+
+    recall = 1.0
+    if truth is not None:
+        hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+        recall = hits / truth.size
+
+    return results, {
+        "storage": index_storage(index),
+        "size_mb": size_mb,
+        "build_ms": build_ms,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": recall
+    }
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="記憶インデックスのベンチマーク")
+    parser.add_argument("--embeddings", default="memory_data/embeddings.npy", help="埋め込みファイル")
+    parser.add_argument("--scale", type=int, default=1, help="コーパスを何倍に複製するか")
+    parser.add_argument("--queries", type=int, default=200, help="クエリ数")
+    parser.add_argument("--top-k", type=int, default=5, help="取得件数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--min-recall", type=float, default=None, help="これを下回る構成があれば終了コード1で終わる")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.embeddings, args.scale, args.seed)
+    rng = np.random.default_rng(args.seed)
+    query_ids = rng.choice(len(corpus), size=min(args.queries, len(corpus)), replace=False)
+    queries = corpus[query_ids]
+    print(f"コーパス: {corpus.shape[0]}件 x {corpus.shape[1]}次元, クエリ: {len(queries)}件, top_k={args.top_k}")
+
+    truth, _ = benchmark("flat", "float32", corpus, queries, args.top_k, None)
+    print(f"{'index':<6} {'storage':<8} {'size(MB)':>9} {'build(ms)':>10} {'p50(ms)':>9} {'p95(ms)':>9} {'recall':>7}")
+    failed = []
+    for kind in ("flat", "hnsw", "ivf"):
+        for storage in ("float32", "float16", "pq"):
+            if resolve_storage(storage, kind, len(corpus)) != storage:
+                continue  # この件数・種別では使えない組み合わせ
+            _, stats = benchmark(kind, storage, corpus, queries, args.top_k, truth)
+            print(f"{kind:<6} {stats['storage']:<8} {stats['size_mb']:>9.2f} {stats['build_ms']:>10.1f} "
+                  f"{stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['recall']:>7.3f}")
+            if args.min_recall is not None and stats["recall"] < args.min_recall:
+                failed.append(f"{kind}/{storage}")
+
+    if failed:
+        print(f"再現率が {args.min_recall} を下回りました: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+記憶ストアの整合性チェック・修復ツール
+
+documents.json / embeddings.npy / index.faiss の件数とチェックサム（snapshot.json に
+記録された値）を照合し、必要に応じて埋め込みからインデックスを作り直す。
+埋め込みモデルは読み込まないため、再エンコードせずに数秒で復旧できる。
+
+documents.json と embeddings.npy の件数が食い違っている場合は記憶ストアを読み込めないため、
+repair でファイルを直接修復する（埋め込みのない記憶を再エンコードするか、--force を付けて
+件数の揃っている先頭部分だけを残す）。修復後はインデックスとスナップショットを作り直す。
+
+使い方:
+    python examples/memory_store_doctor.py verify
+    python examples/memory_store_doctor.py rebuild-index
+    python examples/memory_store_doctor.py compact
+    python examples/memory_store_doctor.py repair --reencode
+    python examples/memory_store_doctor.py repair --force
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import Config
+from memory.hipporag_memory import VTuberMemory
+from memory.index_factory import is_normalized, normalize_vectors
+from memory.memory_journal import atomic_write, file_checksum, temp_path
+
+MODEL_NAME = "cl-nagoya/sup-simcse-ja-large"
+
+
+class Timer:
+    """処理ごとの所要時間を記録する"""
+
+    def __init__(self):
+        self.timings = []
+
+    @contextmanager
+    def measure(self, label: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((label, time.perf_counter() - start))
+
+    def report(self) -> None:
+        for label, seconds in self.timings:
+            print(f"  {label}: {seconds * 1000:.1f}ms")
+
+
+def verify(persist_dir: Path, timer: Timer) -> bool:
+    """件数・次元・チェックサムを照合する（ファイルは書き換えない）"""
+    problems = []
+    documents_file = persist_dir / "documents.json"
+    embeddings_file = persist_dir / "embeddings.npy"
+    index_file = persist_dir / "index.faiss"
+    manifest_file = persist_dir / "snapshot.json"
+    journal_file = persist_dir / "journal.jsonl"
+
+    documents, vectors, index, manifest = [], None, None, {}
+    with timer.measure("documents.json の読み込み"):
+        if documents_file.exists():
+            with open(documents_file, "r", encoding="utf-8") as f:
+                documents = json.load(f)
+    with timer.measure("embeddings.npy の読み込み"):
+        if embeddings_file.exists():
+            vectors = np.load(embeddings_file, mmap_mode="r")
+    with timer.measure("index.faiss の読み込み"):
+        if index_file.exists():
+            index = faiss.read_index(str(index_file))
+    if manifest_file.exists():
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    print(f"documents.json: {len(documents)}件")
+    print(f"embeddings.npy: {vectors.shape if vectors is not None else 'なし'} {vectors.dtype if vectors is not None else ''}")
+    print(f"index.faiss: {index.ntotal if index is not None else 'なし'}件")
+    print(f"snapshot.json: {manifest or 'なし'}")
+
+    if vectors is None:
+        problems.append("embeddings.npy がありません")
+    elif len(vectors) != len(documents):
+        problems.append(f"documents.json ({len(documents)}件) と embeddings.npy ({len(vectors)}件) の件数が一致しません")
+    if index is None:
+        problems.append("index.faiss がありません")
+    else:
+        if vectors is not None and index.ntotal != len(vectors):
+            problems.append(f"index.faiss ({index.ntotal}件) と embeddings.npy ({len(vectors)}件) の件数が一致しません")
+        if vectors is not None and len(vectors) and index.d != vectors.shape[1]:
+            problems.append(f"index.faiss ({index.d}次元) と embeddings.npy ({vectors.shape[1]}次元) の次元が一致しません")
+        if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            problems.append("index.faiss が内積インデックスではありません")
+    if vectors is not None and len(vectors):
+        with timer.measure("埋め込みの正規化確認"):
+            sample = np.asarray(vectors[:min(len(vectors), 1000)], dtype=np.float32)
+            if not is_normalized(sample):
+                problems.append("embeddings.npy が正規化されていません")
+
+    duplicates = [doc_id for doc_id, count in Counter(doc.get("id") for doc in documents).items()
+                  if doc_id is not None and count > 1]
+    if duplicates:
+        problems.append(f"ID が重複した記憶があります ({len(duplicates)}件)")
+
+    if manifest:
+        if manifest.get("count") != len(documents):
+            problems.append(f"snapshot.json の件数 ({manifest.get('count')}) と documents.json の件数が一致しません")
+        with timer.measure("チェックサムの計算"):
+            for name, expected in manifest.get("checksums", {}).items():
+                path = persist_dir / name
+                tmp = temp_path(path)
+                if tmp.exists() and file_checksum(tmp) == expected:
+                    # スナップショットの置き換え途中で停止した（読み込み時に置き換えが完了する）
+                    print(f"{tmp.name}: 置き換え待ちの確定済みファイル（次回の読み込み時に反映されます）")
+                elif not path.exists():
+                    problems.append(f"{name} がありません（チェックサムは記録済み）")
+                elif file_checksum(path) != expected:
+                    problems.append(f"{name} のチェックサムが snapshot.json と一致しません")
+        if "checksums" not in manifest:
+            print("snapshot.json にチェックサムがありません（次回のスナップショット作成時に記録されます）")
+
+    # スナップショットに未反映のジャーナルは読み込み時に再生されるので問題としない
+    if journal_file.exists():
+        pending = 0
+        with open(journal_file, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("lsn", 0) > manifest.get("lsn", 0):
+                    pending += len(record.get("documents", []))
+        print(f"journal.jsonl: 未反映の記憶 {pending}件")
+
+    for problem in problems:
+        print(f"NG: {problem}")
+    if vectors is not None and len(vectors) != len(documents):
+        print("記憶ストアを読み込めません。repair --reencode（埋め込みのない記憶を再エンコード）または "
+              "repair --force（件数の揃っている先頭部分だけを残す）で修復してください")
+    if not problems:
+        print("OK: 記憶ストアは整合しています")
+    return not problems
+
+
+def encode_documents(texts: list, model_name: str) -> np.ndarray:
+    """埋め込みモデルで記憶を再エンコードする（取り込み時と同じく正規化する）"""
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    return normalize_vectors(model.encode(texts, convert_to_numpy=True))
+
+
+def repair(persist_dir: Path, timer: Timer, reencode: bool, force: bool, model_name: str = MODEL_NAME) -> None:
+    """
+    documents.json と embeddings.npy の件数を揃え、snapshot.json を書き直す
+
+    記憶ストアの読み込み（VTuberMemory）は件数が食い違っていると失敗するため、ファイルを直接扱う。
+    記憶は記録順に追加されるので、件数の揃っている先頭部分は記憶と埋め込みが対応しているとみなす。
+
+    Args:
+        reencode: 埋め込みのない末尾の記憶を埋め込みモデルで再エンコードする
+        force: 対応の取れない末尾（埋め込みのない記憶・記憶のない埋め込み）を捨てる
+    """
+    documents_file = persist_dir / "documents.json"
+    embeddings_file = persist_dir / "embeddings.npy"
+    manifest_file = persist_dir / "snapshot.json"
+
+    with timer.measure("documents.json / embeddings.npy の読み込み"):
+        with open(documents_file, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        vectors = np.load(embeddings_file) if embeddings_file.exists() else None
+    manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    # 取り除く記憶の ID も再利用しないよう、修復前の記憶から次の ID を決める
+    ids = [doc["id"] for doc in documents if doc.get("id") is not None]
+    next_id = max(manifest.get("next_id", 0), max(ids, default=-1) + 1)
+
+    vector_count = len(vectors) if vectors is not None else 0
+    if vector_count < len(documents):
+        missing = documents[vector_count:]
+        if reencode:
+            with timer.measure("埋め込みのない記憶の再エンコード"):
+                encoded = encode_documents([doc["page_content"] for doc in missing], model_name)
+            vectors = np.concatenate([vectors, encoded.astype(vectors.dtype)]) if vectors is not None else encoded
+            print(f"埋め込みのない記憶 {len(missing)}件を再エンコードしました")
+        elif force:
+            documents = documents[:vector_count]
+            print(f"埋め込みのない記憶 {len(missing)}件を取り除きました")
+        else:
+            raise SystemExit(f"埋め込みのない記憶が {len(missing)}件あります。"
+                             f"--reencode で再エンコードするか、--force で取り除いてください")
+    elif vector_count > len(documents):
+        if not force:
+            raise SystemExit(f"記憶のない埋め込みが {vector_count - len(documents)}件あります。--force で取り除いてください")
+        vectors = vectors[:len(documents)]
+        print(f"記憶のない埋め込み {vector_count - len(documents)}件を取り除きました")
+    elif manifest.get("count", len(documents)) == len(documents):
+        print("documents.json と embeddings.npy の件数は一致しています")
+
+    with timer.measure("documents.json / embeddings.npy の書き込み"):
+        atomic_write(documents_file, lambda p: p.write_text(
+            json.dumps(documents, ensure_ascii=False, indent=2), encoding="utf-8"))
+        if vectors is not None:
+            def write_vectors(path: Path) -> None:
+                with open(path, "wb") as f:
+                    np.save(f, vectors)
+            atomic_write(embeddings_file, write_vectors)
+    # 修復したファイルに合わせてマニフェストを書き直す（チェックサムは直後のスナップショット作成で記録される）
+    # 反映済みのジャーナル番号はそのまま残し、スナップショットに含まれる記憶が再生されないようにする
+    atomic_write(manifest_file, lambda p: p.write_text(
+        json.dumps({"lsn": manifest.get("lsn", 0), "count": len(documents), "next_id": next_id}), encoding="utf-8"))
+
+
+def open_memory(persist_dir: Path, timer: Timer) -> VTuberMemory:
+    """埋め込みモデルを読み込まずに記憶ストアを開く（ジャーナルの再生と件数の補正も行われる）"""
+    with timer.measure("記憶ストアの読み込み"):
+        memory = VTuberMemory(
+            persist_dir=str(persist_dir),
+            index_type=Config.MEMORY_INDEX_TYPE,
+            ann_threshold=Config.MEMORY_ANN_THRESHOLD,
+            vector_storage=Config.MEMORY_VECTOR_STORAGE,
+            background_load=False,
+            hybrid=False,
+            load_model=False
+        )
+    if memory.load_state != "ready":
+        raise SystemExit(f"記憶ストアを読み込めませんでした: {memory.get_status()['error']}")
+    return memory
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="記憶ストアの整合性チェック・修復ツール")
+    parser.add_argument("command", choices=["verify", "rebuild-index", "compact", "repair"],
+                        help="verify: 照合のみ / rebuild-index: 埋め込みからインデックスを再構築 / "
+                             "compact: ジャーナルと削除済みの記憶をスナップショットに反映 / "
+                             "repair: documents.json と embeddings.npy の件数を揃えてインデックスを再構築")
+    parser.add_argument("--persist-dir", default="memory_data", help="記憶データのディレクトリ")
+    parser.add_argument("--reencode", action="store_true", help="repair: 埋め込みのない記憶を再エンコードする")
+    parser.add_argument("--force", action="store_true", help="repair: 対応の取れない末尾の記憶・埋め込みを捨てる")
+    parser.add_argument("--model", default=MODEL_NAME, help="repair --reencode で使う埋め込みモデル")
+    args = parser.parse_args()
+
+    persist_dir = Path(args.persist_dir)
+    timer = Timer()
+    start = time.perf_counter()
+
+    if args.command == "verify":
+        ok = verify(persist_dir, timer)
+    else:
+        if args.command == "repair":
+            repair(persist_dir, timer, args.reencode, args.force, args.model)
+        memory = open_memory(persist_dir, timer)
+        try:
+            if args.command in ("rebuild-index", "repair"):
+                with timer.measure("インデックスの再構築と保存"):
+                    memory.rebuild_index()
+                print(f"インデックスを再構築しました ({len(memory.documents)}件)")
+            else:
+                with timer.measure("削除済みの記憶の除去と保存"):
+                    removed = memory.compact_records()
+                print(f"スナップショットを作成しました ({len(memory.documents)}件, 除去 {removed}件)")
+        finally:
+            memory.close()
+        ok = verify(persist_dir, timer)
+
+    print(f"所要時間: {time.perf_counter() - start:.2f}s")
+    timer.report()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
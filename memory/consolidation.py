@@ -0,0 +1,206 @@
+"""古い記憶を要約して圧縮する統合ジョブ"""
+
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Protocol
+
+import faiss
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 統合で作られた要約ドキュメントの role
+SUMMARY_ROLE = "summary"
+
+
+class Summarizer(Protocol):
+    """記憶のまとまりを1つの要約文にする"""
+
+    async def summarize(self, texts: List[str]) -> str:
+        ...
+
+
+class ExtractiveSummarizer:
+    """
+    外部 API を使わない抽出型の要約
+
+    各発言の最初の1文を先頭から並べ、max_chars 文字に収める。
+    テストやオフライン環境での動作確認用。
+    """
+
+    def __init__(self, max_chars: int = 200):
+        self.max_chars = max_chars
+
+    async def summarize(self, texts: List[str]) -> str:
+        sentences = []
+        for text in texts:
+            first = re.split(r"(?<=[。！？!?\n])", text.strip(), maxsplit=1)[0].strip()
+            if first and first not in sentences:
+                sentences.append(first)
+        summary = " / ".join(sentences)
+        if len(summary) > self.max_chars:
+            summary = summary[:self.max_chars - 1] + "…"
+        return summary
+
+
+def parse_timestamp(metadata: Dict[str, Any], key: str = "timestamp") -> Optional[datetime]:
+    """メタデータの記録日時（key の値）を datetime に変換（なければ None）"""
+    value = metadata.get(key)
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    # タイムゾーン付きの日時はローカル時刻の naive datetime に揃える
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def last_active(metadata: Dict[str, Any]) -> Optional[datetime]:
+    """
+    記憶が最後に現れた日時（重複として再び現れた日時 last_seen、なければ記録日時）
+
+    古さの判定（統合・アーカイブ・再ランキング）に使う。timestamp は最初に記録した日時のため、
+    常連の視聴者が繰り返し話す話題でも古い記憶として扱われてしまう。
+    """
+    return parse_timestamp(metadata, "last_seen") or parse_timestamp(metadata)
+
+
+def cluster_vectors(vectors: np.ndarray, threshold: float, min_size: int, max_size: int) -> List[List[int]]:
+    """
+    類似したベクトルを貪欲にクラスタリングする
+
+    まだどのクラスタにも属していないベクトルを起点に、コサイン類似度が
+    threshold 以上の近傍を max_size 件までまとめる。
+
+    Args:
+        vectors: 正規化済みのベクトル（shape=(n, d)）
+        threshold: 同じクラスタとみなすコサイン類似度
+        min_size: これより小さいクラスタは捨てる
+        max_size: 1クラスタの最大件数
+
+    Returns:
+        List[List[int]]: 各クラスタに含まれる vectors の行番号
+    """
+    if len(vectors) < min_size:
+        return []
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    k = min(len(vectors), max_size * 2)
+    scores, neighbors = index.search(vectors, k)
+
+    assigned = np.zeros(len(vectors), dtype=bool)
+    clusters = []
+    for seed in range(len(vectors)):
+        if assigned[seed]:
+            continue
+        members = [
+            int(j) for score, j in zip(scores[seed], neighbors[seed])
+            if j >= 0 and score >= threshold and not assigned[j]
+        ][:max_size]
+        if seed not in members:
+            members = [seed] + members[:max_size - 1]
+        if len(members) >= min_size:
+            assigned[members] = True
+            clusters.append(members)
+    return clusters
+
+
+class MemoryConsolidator:
+    """
+    一定期間より古い記憶をクラスタごとに要約へ置き換えるバックグラウンドジョブ
+
+    置き換えた元の記憶はインデックスから外し、アーカイブに移す。
+    """
+
+    def __init__(self, memory, summarizer: Summarizer, min_age: timedelta = timedelta(days=7),
+                 similarity_threshold: float = 0.88, min_cluster_size: int = 3, max_cluster_size: int = 20,
+                 max_documents: int = 2000, interval: float = 3600.0):
+        """
+        初期化
+
+        Args:
+            memory: 対象の VTuberMemory
+            summarizer: 要約の生成方法
+            min_age: これより古い記憶だけを統合対象にする
+            similarity_threshold: 同じ話題とみなすコサイン類似度
+            min_cluster_size: 要約にする最小件数
+            max_cluster_size: 1つの要約にまとめる最大件数
+            max_documents: 1回の実行で調べる記憶の最大件数
+            interval: 定期実行の間隔（秒）
+        """
+        self.memory = memory
+        self.summarizer = summarizer
+        self.min_age = min_age
+        self.similarity_threshold = similarity_threshold
+        self.min_cluster_size = min_cluster_size
+        self.max_cluster_size = max_cluster_size
+        self.max_documents = max_documents
+        self.interval = interval
+
+    async def run_forever(self) -> None:
+        """interval 秒ごとに統合を実行する"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"記憶の統合エラー: {e}")
+
+    async def run_once(self) -> int:
+        """
+        統合を1回実行する
+
+        Returns:
+            int: 要約に置き換えた記憶の件数
+        """
+        cutoff = datetime.now() - self.min_age
+        documents, vectors = await self.memory.run_in_executor(
+            self.memory.consolidation_candidates, cutoff, self.max_documents
+        )
+        if len(documents) < self.min_cluster_size:
+            return 0
+
+        clusters = await self.memory.run_in_executor(
+            cluster_vectors, vectors, self.similarity_threshold, self.min_cluster_size, self.max_cluster_size
+        )
+        if not clusters:
+            return 0
+
+        replacements = []
+        for members in clusters:
+            cluster_docs = [documents[i] for i in members]
+            summary = await self.summarizer.summarize([doc.page_content for doc in cluster_docs])
+            if not summary:
+                continue
+            replacements.append(([doc.id for doc in cluster_docs], summary, self._summary_metadata(cluster_docs)))
+
+        retired = await self.memory.run_in_executor(self.memory.replace_documents, replacements)
+        logger.info(f"記憶を統合しました ({retired}件 → 要約{len(replacements)}件)")
+        return retired
+
+    @staticmethod
+    def _summary_metadata(documents) -> Dict[str, Any]:
+        """要約ドキュメントのメタデータ（元の記憶の期間と出現回数を引き継ぐ）"""
+        timestamps = [t for t in (parse_timestamp(doc.metadata) for doc in documents) if t is not None]
+        # 1人の視聴者に関する記憶だけをまとめた場合は、その視聴者の記憶として残す
+        authors = {doc.metadata.get("author") or doc.metadata.get("reply_to") for doc in documents}
+        metadata = {
+            "role": SUMMARY_ROLE,
+            "timestamp": datetime.now().isoformat(),
+            "period_start": min(timestamps).isoformat() if timestamps else None,
+            "period_end": max(timestamps).isoformat() if timestamps else None,
+            "source_ids": [doc.id for doc in documents],
+            "hit_count": sum(doc.metadata.get("hit_count", 1) for doc in documents)
+        }
+        if len(authors) == 1 and None not in authors:
+            metadata["author"] = authors.pop()
+        return metadata
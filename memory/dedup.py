@@ -0,0 +1,49 @@
+"""記憶の重複・ほぼ重複の判定と統合"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from memory.query_cache import normalize_query
+
+
+def dedup_key(text: str) -> str:
+    """完全一致判定用のキー（表記揺れを吸収したテキスト）"""
+    return normalize_query(text)
+
+
+def can_merge(existing: Dict[str, Any], incoming: Dict[str, Any]) -> bool:
+    """同じ話者・同じ投稿者（応答の場合は同じ相手）の記憶同士のみ統合する"""
+    return (existing.get("role") == incoming.get("role")
+            and existing.get("author") == incoming.get("author")
+            and existing.get("reply_to") == incoming.get("reply_to"))
+
+
+def merge_metadata(existing: Dict[str, Any], incoming: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    重複した記憶のメタデータを統合する
+
+    出現回数（hit_count）を増やし、最後に出現した日時（last_seen）を更新する。
+    最初の記録日時（timestamp）はそのまま残す。
+    """
+    merged = dict(existing)
+    merged["hit_count"] = existing.get("hit_count", 1) + incoming.get("hit_count", 1)
+    merged["last_seen"] = incoming.get("timestamp") or datetime.now().isoformat()
+    return merged
+
+
+def find_in_batch(vector: np.ndarray, key: str, keys: List[str], vectors: List[np.ndarray],
+                  threshold: Optional[float]) -> Optional[int]:
+    """
+    同じバッチ内で先に現れた記憶との重複を探す
+
+    Returns:
+        Optional[int]: 重複している記憶のバッチ内の位置（なければ None）
+    """
+    for position, (other_key, other) in enumerate(zip(keys, vectors)):
+        if other_key == key:
+            return position
+        if threshold is not None and float(np.dot(vector, other)) >= threshold:
+            return position
+    return None
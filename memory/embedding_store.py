@@ -0,0 +1,117 @@
+"""埋め込みベクトルの保存領域（スナップショットはメモリマップで参照する）"""
+
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from memory.memory_journal import atomic_write
+
+
+class EmbeddingStore:
+    """
+    スナップショット分の埋め込みをメモリマップで参照し、その後に追加された
+    埋め込みだけをメモリ上に保持する
+
+    埋め込み全体が必要になるのはインデックスの再構築とスナップショット作成時
+    だけなので、通常の検索・追加では RAM に全件を載せない。
+    """
+
+    def __init__(self, dtype: str = "float32"):
+        """
+        初期化
+
+        Args:
+            dtype: ディスク・メモリ上の保存型（"float32" または "float16"）
+        """
+        self.dtype = np.dtype(dtype)
+        self._base: Optional[np.ndarray] = None
+        self._tail: List[np.ndarray] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """ベクトルの次元数（空の場合は None）"""
+        if self._base is not None:
+            return self._base.shape[1]
+        if self._tail:
+            return self._tail[0].shape[1]
+        return None
+
+    @property
+    def stored_dtype(self) -> Optional[np.dtype]:
+        """読み込んだスナップショットの型（設定と異なれば変換が必要）"""
+        return self._base.dtype if self._base is not None else None
+
+    def load(self, path: Path, mmap: bool = True) -> None:
+        """スナップショットを読み込む（mmap=True の場合は必要な部分だけディスクから読む）"""
+        self._base = np.load(path, mmap_mode="r" if mmap else None)
+        self._tail = []
+        self._count = len(self._base)
+
+    def set(self, vectors: np.ndarray) -> None:
+        """全件を置き換える"""
+        self._base = np.ascontiguousarray(vectors, dtype=self.dtype)
+        self._tail = []
+        self._count = len(self._base)
+
+    def append(self, vectors: np.ndarray) -> None:
+        """末尾にベクトルを追加する"""
+        self._tail.append(np.ascontiguousarray(vectors, dtype=self.dtype))
+        self._count += len(vectors)
+
+    def take(self, positions: List[int]) -> np.ndarray:
+        """指定した行だけを float32 の配列として取得する（全件の連結はしない）"""
+        positions = np.asarray(positions, dtype=np.int64)
+        base_count = len(self._base) if self._base is not None else 0
+        if len(positions) and positions.max() < base_count:
+            # スナップショット内の行だけならメモリマップから必要な行だけ読む
+            return np.ascontiguousarray(self._base[positions], dtype=np.float32)
+        if len(positions) and (positions.min() < 0 or positions.max() >= self._count):
+            raise IndexError("埋め込みの位置が範囲外です")
+
+        result = np.empty((len(positions), self.dimension or 0), dtype=np.float32)
+        in_base = positions < base_count
+        if in_base.any():
+            result[in_base] = self._base[positions[in_base]]
+        # 追加分は追加ごとの配列に分かれているので、各行がどの配列の何行目かを求める
+        offsets = np.cumsum([base_count] + [len(part) for part in self._tail])
+        tail_positions = positions[~in_base]
+        chunks = np.searchsorted(offsets, tail_positions, side="right") - 1
+        for chunk in np.unique(chunks):
+            selected = ~in_base
+            selected[selected] = chunks == chunk
+            result[selected] = self._tail[chunk][positions[selected] - offsets[chunk]]
+        return result
+
+    def to_array(self) -> np.ndarray:
+        """全件を float32 の配列として取得する"""
+        parts = ([self._base] if self._base is not None else []) + self._tail
+        if not parts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.concatenate(parts, axis=0), dtype=np.float32)
+
+    def write(self, path: Path) -> None:
+        """
+        全件を保存型で path に書き出す（置き換えと読み込み直しは呼び出し側で行う）
+
+        書き出した内容はメモリ上に保持し、読み込み元のファイルのメモリマップを解放する
+        （Windows では開いたままだと置き換えられない）。
+        """
+        vectors = np.concatenate(
+            ([self._base] if self._base is not None else []) + self._tail, axis=0
+        ).astype(self.dtype, copy=False)
+        self._base = vectors
+        self._tail = []
+        with open(path, "wb") as f:
+            np.save(f, vectors)
+
+    def save(self, path: Path) -> None:
+        """全件を保存型で書き出し、以後は書き出したファイルをメモリマップで参照する"""
+        if self._count == 0:
+            return
+        atomic_write(path, self.write)
+        self.load(path)
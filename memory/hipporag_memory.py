@@ -1,23 +1,53 @@
 """HippoRAG ラッパーモジュール"""
 
 from typing import List, Dict
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
+from datetime import datetime
 from pathlib import Path
 import os
+import time
+import atexit
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import get_logger
+from memory.memory_journal import MemoryJournal, atomic_write, encode_vector, decode_vector, file_checksum, temp_path
+from memory.query_cache import LRUCache, normalize_query
+from memory.index_factory import (
+    build_index, index_kind, index_storage, is_normalized, needs_retrain, normalize_vectors,
+    resolve_index_type, resolve_storage, search_rescored
+)
+from memory.embedding_store import EmbeddingStore
+from memory.dedup import can_merge, dedup_key, find_in_batch, merge_metadata
+from memory.consolidation import SUMMARY_ROLE, last_active
+from memory.reranker import RerankWeights, rerank
+from memory.lexical_index import RRF_K, BM25Index, reciprocal_rank_fusion
+from memory.shards import ColdShardStore, shard_name
+from memory.sqlite_store import SQLiteStore
+
+logger = get_logger(__name__)
+
+
+def partition_key(metadata: Dict[str, Any]) -> Optional[str]:
+    """記憶が属する視聴者（投稿者本人の発言、またはその視聴者への応答）"""
+    return metadata.get("author") or metadata.get("reply_to")
 
 
 @dataclass
 class Document:
     page_content: str
     metadata: Dict[str, Any]
+    id: Optional[int] = None  # 削除や並べ替えがあっても変わらない記憶ID
 
     def to_dict(self) -> Dict[str, Any]:
         return {
+            "id": self.id,
             "page_content": self.page_content,
             "metadata": self.metadata
         }
@@ -26,20 +56,81 @@ class Document:
     def from_dict(cls, data: Dict[str, Any]) -> 'Document':
         return cls(
             page_content=data["page_content"],
-            metadata=data["metadata"]
+            metadata=data["metadata"],
+            id=data.get("id")
         )
 
 
+@dataclass
+class MemoryHit:
+    """検索結果1件分"""
+    id: int
+    text: str
+    metadata: Dict[str, Any]
+    score: float  # コサイン類似度
+    rank_score: Optional[float] = None  # 再ランキング後のスコア
+    lexical_score: Optional[float] = None  # クエリに対する BM25 スコアの比率（0〜1、語彙検索でヒットした場合）
+    relevance: Optional[float] = None  # ベクトル検索と語彙検索の逆順位融合スコア（0〜1）
+
+
 class VTuberMemory:
     """AIVTuber 用の HippoRAG ラッパー。"""
 
     def __init__(self, model_name: str = "cl-nagoya/sup-simcse-ja-large", use_gpu: bool = False, 
-                 persist_dir: str = "memory_data"):
-        device = "cuda" if use_gpu else "cpu"
-        self.embed_model = SentenceTransformer(model_name, device=device)
+                 persist_dir: str = "memory_data", flush_interval: float = 5.0, flush_batch_size: int = 16,
+                 compact_threshold: int = 200, max_workers: int = 1,
+                 cache_size: int = 256, cache_ttl: Optional[float] = 600.0,
+                 index_type: str = "auto", ann_threshold: int = 20000, min_similarity: float = 0.8,
+                 vector_storage: str = "float32", background_load: bool = True,
+                 dedup_threshold: Optional[float] = 0.97, rerank_weights: Optional[RerankWeights] = None,
+                 hybrid: bool = True, lexical_min_score: float = 0.5, author_partition_limit: int = 1000,
+                 load_model: bool = True, store: Optional[SQLiteStore] = None):
+        self.model_name = model_name
+        self.device = "cuda" if use_gpu else "cpu"
+        self.embed_model = None  # ウォームアップで読み込む
+        self.load_model = load_model  # False の場合は記憶ストアだけを読み込む（保守ツール用。検索・追加は不可）
+        # 記憶のメタデータを SQLite にも保存し、期間・投稿者・話者で検索できるようにする（None で無効）
+        self.store = store
         self.documents: List[Document] = []
-        self.embeddings: Optional[np.ndarray] = None
-        self.index: Optional[faiss.IndexFlatL2] = None
+        # "float32" / "float16" / "pq"（インデックスのベクトルを量子化し、embeddings.npy は float16 で保存）
+        resolve_storage(vector_storage, "flat", 0)
+        self.vector_storage = vector_storage
+        self.embeddings = EmbeddingStore("float32" if vector_storage == "float32" else "float16")
+        self.index: Optional[faiss.Index] = None
+        # "flat"（厳密検索）/ "hnsw" / "ivf" / "auto"（ann_threshold 件を超えたら HNSW に昇格）
+        resolve_index_type(index_type, 0, ann_threshold)
+        self.index_type = index_type
+        self.ann_threshold = ann_threshold
+        # 正規化したベクトルの内積（= コサイン類似度）がこの値未満の記憶は返さない
+        # （sup-simcse-ja-large では無関係な記憶同士でも中央値 0.6 前後、上位 5% が 0.8 程度になる）
+        self.min_similarity = min_similarity
+        # 既存の記憶とのコサイン類似度がこの値以上なら新規追加せず統合する（None で完全一致のみ）
+        self.dedup_threshold = dedup_threshold
+        # 類似度検索の候補を新しさ・話者・参照頻度で並べ替える（None で類似度順のまま）
+        self.rerank_weights = rerank_weights
+        # 文字 n-gram の BM25 による語彙検索をベクトル検索と融合する（hybrid=False で無効）
+        # 固有名詞や珍しい語が一致した記憶は、クエリの全索引語が一致した場合のスコアに対する
+        # BM25 スコアの比率が lexical_min_score 以上なら類似度の下限未満でも返す
+        # （生の BM25 スコアはクエリの長さや記憶の件数で大きく変わるため、そのままでは閾値にできない）
+        self._lexical: Optional[BM25Index] = BM25Index() if hybrid else None
+        self.lexical_min_score = lexical_min_score
+        self._access_counts: Dict[int, int] = {}  # 記憶ID → 検索結果として返した回数
+        self._positions: Dict[int, int] = {}  # 記憶ID → documents / インデックス上の位置
+        self._text_keys: Dict[str, int] = {}  # 正規化テキスト → 記憶ID（完全一致の重複判定用）
+        self._author_ids: Dict[str, List[int]] = {}  # 視聴者 → 記憶IDのリスト（記録順）
+        # 視聴者ごとの検索では直近の author_partition_limit 件だけを全件比較する（検索コストの上限）
+        self.author_partition_limit = author_partition_limit
+        self._lsn = 0  # ジャーナルに書いた最後のレコード番号
+        self._next_id = 0
+        self._trained_count = 0  # インデックス（IVF / PQ の学習）を作った時点の件数
+        self.last_add_latency: float = 0.0  # 直近の add にかかった秒数
+        self._lock = threading.RLock()
+        # 埋め込み計算をイベントループから切り離すための専用スレッドプール（同時実行数を制限）
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vtuber-memory")
+        # クエリ埋め込みと検索結果のキャッシュ（検索結果は記憶が追加されるたびに無効化）
+        self._embedding_cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self._result_cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self._generation = 0
         
         # 永続化用のディレクトリ設定
         self.persist_dir = Path(persist_dir)
@@ -47,73 +138,913 @@ class VTuberMemory:
         self.documents_file = self.persist_dir / "documents.json"
         self.embeddings_file = self.persist_dir / "embeddings.npy"
         self.index_file = self.persist_dir / "index.faiss"
+        self.manifest_file = self.persist_dir / "snapshot.json"
+        self.archive_file = self.persist_dir / "archive.jsonl"  # 統合で置き換えられた元の記憶
+        # 保持期間を過ぎた記憶の月別シャード（通常の検索対象外。search_cold で明示的に検索する）
+        self.cold_shards = ColdShardStore(self.persist_dir / "shards")
+        
+        # 追記型ジャーナル（一定件数たまったらスナップショットへ統合）
+        self.compact_threshold = compact_threshold
+        self._journal = MemoryJournal(
+            self.persist_dir / "journal.jsonl",
+            flush_interval=flush_interval,
+            batch_size=flush_batch_size,
+            after_flush=self._on_journal_flush
+        )
         
-        # 保存済みデータの読み込み
-        self._load_persisted_data()
+        # モデルと保存済みデータの読み込み（既定ではバックグラウンドで行い、起動を待たせない）
+        self.load_state = "loading"  # "loading" / "ready" / "error"
+        self.load_seconds: Optional[float] = None
+        self._load_error: Optional[BaseException] = None
+        self._ready = threading.Event()
+        if background_load:
+            self._executor.submit(self._warm_up)
+        else:
+            self._warm_up()
+        atexit.register(self.close)
+
+    def _warm_up(self) -> None:
+        """埋め込みモデルと記憶ストアを読み込む"""
+        start = time.perf_counter()
+        try:
+            if self.load_model:
+                from sentence_transformers import SentenceTransformer
+
+                self.embed_model = SentenceTransformer(self.model_name, device=self.device)
+            with self._lock:
+                self._load_persisted_data()
+            self._journal.start()
+            self.load_state = "ready"
+            logger.info(f"長期記憶の準備が完了しました ({len(self.documents)}件, {time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            self._load_error = e
+            self.load_state = "error"
+            # 読み込み途中の状態は使わず、空の記憶として動作を続ける（保存済みのファイルは書き換えない）
+            with self._lock:
+                self.documents = []
+                self.embeddings = EmbeddingStore(self.embeddings.dtype.name)
+                self.index = None
+                self._reindex_documents()
+                if self._lexical is not None:
+                    self._lexical.clear()
+            logger.error(f"長期記憶の読み込みエラー: {e}（長期記憶を使わずに動作を続けます）")
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._ready.set()
+
+    def is_ready(self) -> bool:
+        """長期記憶が利用可能か"""
+        return self.load_state == "ready"
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> None:
+        """
+        ウォームアップの完了を待つ
+
+        Raises:
+            TimeoutError: timeout 秒以内に完了しなかった場合
+            RuntimeError: 読み込みに失敗していた場合
+        """
+        if not self._ready.wait(timeout):
+            raise TimeoutError("長期記憶の読み込みが完了していません")
+        if self._load_error is not None:
+            raise RuntimeError(f"長期記憶の読み込みに失敗しました: {self._load_error}")
+
+    def _usable(self) -> bool:
+        """
+        ウォームアップの完了を待ち、記憶を使えるかどうかを返す
+
+        読み込みに失敗した場合は空の記憶として振る舞い（検索結果なし・追加しない）、
+        長期記憶なしでもコメントへの応答を続けられるようにする。
+        """
+        self._ready.wait()
+        return self._load_error is None
+
+    def get_status(self) -> Dict[str, Any]:
+        """読み込み状態を取得する（監視用）"""
+        return {
+            "state": self.load_state,
+            "documents": len(self.documents) if self.is_ready() else None,
+            "load_seconds": self.load_seconds,
+            "error": str(self._load_error) if self._load_error else None,
+            "cold_shards": self.cold_shards.list_shards()
+        }
 
     def _load_persisted_data(self):
-        """保存済みデータを読み込む"""
+        """スナップショットを読み込み、ジャーナルの差分を再生する"""
+        manifest = self._recover_snapshot()
+        self._verify_snapshot(manifest)
+
         if self.documents_file.exists():
             with open(self.documents_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
                 self.documents = [Document.from_dict(d) for d in data]
         
         if self.embeddings_file.exists():
-            self.embeddings = np.load(self.embeddings_file)
+            self.embeddings.load(self.embeddings_file)
             
         if self.index_file.exists():
             self.index = faiss.read_index(str(self.index_file))
-        elif self.embeddings is not None:
-            dimension = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(self.embeddings)
+
+        # 埋め込みと記憶の対応は位置で決まるため、件数が食い違うスナップショットは使わない
+        # （件数の少ない方に揃えると、残った埋め込みが別の記憶と組み合わさってしまう）
+        if ((self.embeddings_file.exists() and len(self.embeddings) != len(self.documents))
+                or manifest.get("count", len(self.documents)) != len(self.documents)):
+            raise RuntimeError(
+                f"記憶スナップショットの件数が一致しません (documents={len(self.documents)}, "
+                f"embeddings={len(self.embeddings)})。examples/memory_store_doctor.py repair で修復してください"
+            )
+
+        # スナップショットに反映済みのジャーナル番号
+        snapshot_lsn = manifest.get("lsn", 0)
+        self._next_id = manifest.get("next_id", 0)
+        # 記録がない旧形式のスナップショットは、スナップショットの件数で学習したものとみなす
+        self._trained_count = manifest.get("trained_count", len(self.documents))
+        self._lsn = snapshot_lsn
+
+        # ジャーナルの再生（1レコード = add_many 1回分）
+        snapshot_count = len(self.documents)
+        records = self._journal.replay()
+        updates: List[Dict[str, Any]] = []
+        vectors = []
+        for record in records:
+            lsn = record.get("lsn")
+            if lsn is not None:
+                if lsn <= snapshot_lsn:
+                    continue
+                self._lsn = max(self._lsn, lsn)
+            seq = record["seq"]
+            entries = record.get("documents", [])
+            if entries and seq + len(entries) > len(self.documents):
+                if seq != len(self.documents):
+                    logger.warning(f"記憶ジャーナルに欠番があるため seq={seq} 以降を破棄します")
+                    break
+                for entry in entries:
+                    self.documents.append(Document.from_dict(entry))
+                    vectors.append(decode_vector(entry["embedding"]))
+            updates.extend(record.get("updates", []))
+        replayed = np.vstack(vectors) if vectors else None
+        if replayed is not None:
+            self.embeddings.append(replayed)
+            logger.info(f"記憶ジャーナルから{len(vectors)}件を復元しました")
+
+        self._reindex_documents()
+
+        # 重複統合によるメタデータの更新を反映
+        for update in updates:
+            position = self._positions.get(update["id"])
+            if position is not None:
+                self.documents[position].metadata = update["metadata"]
+
+        # SQLite に未反映の記憶があれば書き込む（ジャーナルだけに残っていた記憶など）
+        if self.store is not None and self.store.document_count("hot") != len(self.documents):
+            self.store.upsert_documents(doc.to_dict() for doc in self.documents)
+
+        if self._lexical is not None:
+            self._lexical.clear()
+            for doc in self.documents:
+                self._lexical.add(doc.id, doc.page_content)
+
+        if not len(self.embeddings):
+            return
+
+        # 旧形式（正規化前のベクトル / L2 インデックス / 別の保存型）のデータは変換してスナップショットを作り直す
+        needs_snapshot = self.embeddings.stored_dtype not in (None, self.embeddings.dtype)
+        if self.index is None or self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            # 内積インデックスがない場合のみ全件を読み込んで正規化済みか確認する
+            vectors = self.embeddings.to_array()
+            if not is_normalized(vectors):
+                logger.info("記憶の埋め込みを正規化します")
+                self.embeddings.set(normalize_vectors(vectors))
+            self.index = None
+
+        # スナップショットのインデックスにはジャーナルから復元した分だけを追加する
+        # （全件の再構築や IVF / PQ の再学習をすると、起動のたびに記憶の件数に比例した時間がかかる）
+        if self.index is not None and replayed is not None and self.index.ntotal == snapshot_count:
+            self.index.add(np.ascontiguousarray(replayed, dtype=np.float32))
+
+        # インデックスが埋め込みと一致しなければ埋め込みから作り直す（再エンコード不要）
+        if self.index is None or self.index.ntotal != len(self.embeddings):
+            self._build_index_from_embeddings()
+            needs_snapshot = True
+        else:
+            needs_snapshot = self._maybe_promote_index() or needs_snapshot
+        if needs_snapshot:
+            self.compact()
+
+    def _snapshot_files(self) -> List[Path]:
+        return [self.embeddings_file, self.index_file, self.documents_file]
+
+    def _recover_snapshot(self) -> Dict[str, Any]:
+        """
+        マニフェストを読み込み、置き換えの途中で止まったスナップショットを完成させる
+
+        マニフェストに記録されたチェックサムと一致する一時ファイルは確定済みの内容なので
+        正式な名前に置き換え、一致しない一時ファイル（マニフェストを書く前に止まった書きかけ）は消す。
+
+        Returns:
+            Dict[str, Any]: マニフェスト（ない場合は空）
+        """
+        manifest: Dict[str, Any] = {}
+        if self.manifest_file.exists():
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        checksums = manifest.get("checksums", {})
+        for path in self._snapshot_files():
+            tmp = temp_path(path)
+            if not tmp.exists():
+                continue
+            if path.name in checksums and file_checksum(tmp) == checksums[path.name]:
+                os.replace(tmp, path)
+                logger.info(f"置き換えの途中だった記憶スナップショットを反映しました: {path.name}")
+            else:
+                tmp.unlink()
+        return manifest
+
+    def _verify_snapshot(self, manifest: Dict[str, Any]) -> None:
+        """
+        スナップショットのファイルがマニフェストのチェックサムと一致するか確認する
+
+        Raises:
+            RuntimeError: 一致しない場合（途中まで書き換えられたスナップショットを読み込まない）
+        """
+        problems = []
+        for name, expected in manifest.get("checksums", {}).items():
+            path = self.persist_dir / name
+            if not path.exists():
+                problems.append(f"{name} がありません")
+            elif file_checksum(path) != expected:
+                problems.append(f"{name} のチェックサムが一致しません")
+        if problems:
+            raise RuntimeError(
+                f"記憶スナップショットが snapshot.json と一致しません ({', '.join(problems)})。"
+                f"examples/memory_store_doctor.py verify で確認し、repair で修復してください"
+            )
+
+    def _reindex_documents(self) -> None:
+        """記憶IDから位置・テキストを引くための対応表を作り直す"""
+        # ID を持たない旧形式のドキュメントには位置に基づく ID を振る
+        for position, doc in enumerate(self.documents):
+            if doc.id is None:
+                doc.id = position
+        self._positions = {doc.id: position for position, doc in enumerate(self.documents)}
+        self._text_keys = {dedup_key(doc.page_content): doc.id for doc in self.documents}
+        self._author_ids = {}
+        for doc in self.documents:
+            author = partition_key(doc.metadata)
+            if author:
+                self._author_ids.setdefault(author, []).append(doc.id)
+        # 統合で削除された ID を再利用しないよう、次の ID は減らさない
+        self._next_id = max(self._next_id, max(self._positions, default=-1) + 1)
 
     def _persist_data(self):
-        """データを永続化"""
-        # ドキュメントの保存
-        with open(self.documents_file, "w", encoding="utf-8") as f:
-            json.dump([doc.to_dict() for doc in self.documents], f, ensure_ascii=False, indent=2)
-        
-        # 埋め込みの保存
-        if self.embeddings is not None:
-            np.save(self.embeddings_file, self.embeddings)
-        
-        # FAISSインデックスの保存
+        """
+        スナップショットを書き出す
+
+        埋め込み・インデックス・ドキュメントをすべて一時ファイルに書いてから、
+        それらのチェックサムを記録したマニフェストを書き（ここでスナップショットが確定する）、
+        最後に一時ファイルを正式な名前に置き換える。どの時点で止まっても、読み込み時には
+        古いスナップショットか新しいスナップショットのどちらか一方だけが使われる。
+        """
+        written: Dict[Path, Path] = {}
+
+        # 埋め込み（空の場合は古いファイルを残さないよう確定後に消す）
+        if len(self.embeddings):
+            written[self.embeddings_file] = temp_path(self.embeddings_file)
+            self.embeddings.write(written[self.embeddings_file])
+
+        # FAISSインデックス
         if self.index is not None:
-            faiss.write_index(self.index, str(self.index_file))
+            written[self.index_file] = temp_path(self.index_file)
+            faiss.write_index(self.index, str(written[self.index_file]))
+
+        # ドキュメント
+        written[self.documents_file] = temp_path(self.documents_file)
+        with open(written[self.documents_file], "w", encoding="utf-8") as f:
+            json.dump([doc.to_dict() for doc in self.documents], f, ensure_ascii=False, indent=2)
+
+        # どのジャーナルレコードまで反映済みかと、各ファイルのチェックサムを記録
+        checksums = {path.name: file_checksum(tmp) for path, tmp in written.items()}
+        atomic_write(self.manifest_file, lambda p: p.write_text(
+            json.dumps({"lsn": self._lsn, "count": len(self.documents), "next_id": self._next_id,
+                        "trained_count": self._trained_count,
+                        "checksums": checksums}), encoding="utf-8"))
+
+        for path in self._snapshot_files():
+            if path in written:
+                os.replace(written[path], path)
+            else:
+                path.unlink(missing_ok=True)
+        # 書き出した埋め込みはメモリマップで参照し直す
+        if self.embeddings_file in written:
+            self.embeddings.load(self.embeddings_file)
+
+    def _on_journal_flush(self, journal_count: int) -> None:
+        """ジャーナルが閾値を超えたらスナップショットに統合する"""
+        if journal_count >= self.compact_threshold:
+            self.compact()
+
+    def compact(self) -> None:
+        """現在の記憶をスナップショットに書き出し、ジャーナルを空にする"""
+        if self._load_error is not None:
+            return  # 読み込みに失敗した状態でスナップショットを上書きしない
+        with self._lock:
+            start = time.perf_counter()
+            self._persist_data()
+            self._journal.reset()
+            logger.info(f"記憶スナップショットを作成しました ({len(self.documents)}件, {(time.perf_counter() - start) * 1000:.1f}ms)")
+
+    def flush(self) -> None:
+        """バッファされた記憶をジャーナルに書き出す"""
+        self._journal.flush()
+
+    def close(self) -> None:
+        """定期フラッシュを止め、未書き込みの記憶を保存する"""
+        self._executor.shutdown(wait=True)
+        self._journal.close()
 
-    def _update_index(self):
-        """FAISSインデックスを更新"""
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """テキストを正規化済みの埋め込みに変換（モデルはコサイン類似度で学習されている）"""
+        if self.embed_model is None:
+            raise RuntimeError("埋め込みモデルを読み込んでいません（load_model=False）")
+        return normalize_vectors(self.embed_model.encode(texts, convert_to_numpy=True))
+
+    def _build_index_from_embeddings(self) -> None:
+        """保持している埋め込みから設定に合ったインデックスを作る（再エンコード不要）"""
+        count = len(self.embeddings)
+        kind = resolve_index_type(self.index_type, count, self.ann_threshold)
+        storage = resolve_storage(self.vector_storage, kind, count)
+        start = time.perf_counter()
+        self.index = build_index(kind, self.embeddings.to_array(), storage=storage)
+        self._trained_count = count
+        logger.info(f"記憶インデックスを構築しました ({kind}/{storage}, {count}件, {(time.perf_counter() - start) * 1000:.1f}ms)")
+
+    def _maybe_promote_index(self) -> bool:
+        """
+        件数や設定に合わせてインデックスを作り直す
+
+        厳密検索から近似最近傍検索への昇格、保存形式の変更、IVF / PQ の再学習を行う。
+
+        Returns:
+            bool: 作り直した場合は True
+        """
+        if not len(self.embeddings) or self.index is None:
+            return False
+        count = len(self.embeddings)
+        kind = resolve_index_type(self.index_type, count, self.ann_threshold)
+        storage = resolve_storage(self.vector_storage, kind, count)
+        if kind != index_kind(self.index) or storage != index_storage(self.index):
+            logger.info(f"記憶インデックスを {index_kind(self.index)}/{index_storage(self.index)} から {kind}/{storage} に切り替えます")
+        elif not needs_retrain(self.index, count, self._trained_count):
+            return False
+        # IVF / PQ は蓄積したデータで学習し直す
+        self._build_index_from_embeddings()
+        return True
+
+    def _rebuild_index(self):
+        """全ドキュメントから埋め込みとFAISSインデックスを再構築"""
         if not self.documents:
             return
 
         # 埋め込みを計算
         texts = [doc.page_content for doc in self.documents]
-        self.embeddings = self.embed_model.encode(texts, convert_to_numpy=True)
+        self.embeddings.set(self._encode(texts))
         
         # FAISSインデックスを作成
-        dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(self.embeddings)
+        self._build_index_from_embeddings()
+        self._invalidate_results()
         
         # データを永続化
-        self._persist_data()
+        self.compact()
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        """新しい埋め込みを既存の配列とインデックスに追加"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.embeddings.append(vectors)
+        if self.index is None:
+            self._build_index_from_embeddings()
+            return
+        self.index.add(vectors)
+        self._maybe_promote_index()
 
     def add(self, text: str, meta: Dict | None = None) -> None:
-        """会話やイベントを記憶に追加"""
-        self.documents.append(Document(page_content=text, metadata=meta or {}))
-        self._update_index()
+        """会話やイベントを記憶に追加（新しいテキストのみエンコード）"""
+        self.add_many([text], [meta or {}])
+
+    def add_many(self, texts: List[str], metas: List[Dict] | None = None) -> None:
+        """
+        複数の会話をまとめて記憶に追加する
+
+        埋め込みは1回の推論でまとめて計算し、ジャーナルには1レコードとして
+        書き込むため、バッチ全体が保存されるか全く保存されないかのどちらかになる。
+
+        Args:
+            texts: 追加するテキストのリスト
+            metas: 各テキストのメタデータ（texts と同じ長さ）
+        """
+        if not texts:
+            return
+        if not self._usable():
+            return
+        if metas is None:
+            metas = [{} for _ in texts]
+        if len(metas) != len(texts):
+            raise ValueError("texts と metas の長さが一致しません")
+
+        start = time.perf_counter()
+
+        # 既存データとインデックスの件数がずれている場合のみ全体を再構築
+        if self.documents and (self.index is None or self.index.ntotal != len(self.documents)):
+            logger.warning("記憶インデックスの件数が不一致のため再構築します")
+            self._rebuild_index()
+
+        vectors = self._encode(texts)
+        with self._lock:
+            documents: List[Document] = []
+            new_vectors: List[np.ndarray] = []
+            batch_keys: List[str] = []
+            updates: Dict[int, Dict[str, Any]] = {}
+            for text, meta, vector in zip(texts, metas, vectors):
+                meta = meta or {}
+                key = dedup_key(text)
+
+                # 既存の記憶と重複していればメタデータだけ更新する
+                existing = self._find_duplicate(key, vector, meta)
+                if existing is not None:
+                    existing.metadata = merge_metadata(existing.metadata, meta)
+                    updates[existing.id] = existing.metadata
+                    continue
+
+                # 同じバッチ内の重複
+                position = find_in_batch(vector, key, batch_keys, new_vectors, self.dedup_threshold)
+                if position is not None and can_merge(documents[position].metadata, meta):
+                    documents[position].metadata = merge_metadata(documents[position].metadata, meta)
+                    continue
 
-    def retrieve(self, query: str, top_k: int = 5) -> List[str]:
-        """質問に関連するコンテキストを RAG で取得"""
+                documents.append(Document(page_content=text, metadata=meta, id=self._next_id))
+                self._next_id += 1
+                new_vectors.append(vector)
+                batch_keys.append(key)
+
+            seq = len(self.documents)
+            for offset, (doc, key) in enumerate(zip(documents, batch_keys)):
+                self._positions[doc.id] = seq + offset
+                self._text_keys[key] = doc.id
+                author = partition_key(doc.metadata)
+                if author:
+                    self._author_ids.setdefault(author, []).append(doc.id)
+                if self._lexical is not None:
+                    self._lexical.add(doc.id, doc.page_content)
+            self.documents.extend(documents)
+            if new_vectors:
+                self._append_vectors(np.vstack(new_vectors))
+            self._invalidate_results()
+
+            # 永続化はジャーナルへの追記のみ（実際の書き込みはまとめて行う）
+            self._lsn += 1
+            self._journal.append({
+                "lsn": self._lsn,
+                "seq": seq,
+                "documents": [
+                    {**doc.to_dict(), "embedding": encode_vector(vector)}
+                    for doc, vector in zip(documents, new_vectors)
+                ],
+                "updates": [{"id": doc_id, "metadata": metadata} for doc_id, metadata in updates.items()]
+            })
+            if self.store is not None:
+                self.store.upsert_documents(doc.to_dict() for doc in documents)
+                self.store.update_document_metadata(updates)
+
+        self.last_add_latency = time.perf_counter() - start
+        merged = len(texts) - len(documents)
+        logger.info(f"記憶を{len(documents)}件追加しました (重複統合{merged}件, 計{len(self.documents)}件, {self.last_add_latency * 1000:.1f}ms)")
+
+    def _find_duplicate(self, key: str, vector: np.ndarray, meta: Dict[str, Any]) -> Optional[Document]:
+        """完全一致またはベクトルがほぼ同じ既存の記憶を探す"""
+        doc_id = self._text_keys.get(key)
+        if doc_id is not None:
+            doc = self.documents[self._positions[doc_id]]
+            if can_merge(doc.metadata, meta):
+                return doc
+
+        if self.dedup_threshold is None or self.index is None or not self.index.ntotal:
+            return None
+        nearest = search_rescored(self.index, vector.reshape(1, -1), 1, self.embeddings.take)
+        if nearest and nearest[0][1] >= self.dedup_threshold:
+            doc = self.documents[nearest[0][0]]
+            if can_merge(doc.metadata, meta):
+                return doc
+        return None
+
+    def consolidation_candidates(self, cutoff: datetime, limit: int) -> Tuple[List[Document], np.ndarray]:
+        """
+        統合の対象になる古い記憶を取得する
+
+        Args:
+            cutoff: これより前に最後に現れた記憶を対象にする（日時が不明な記憶は新旧を判断できないため対象外）
+            limit: 最大件数（古いものから）
+
+        Returns:
+            Tuple[List[Document], np.ndarray]: 記憶とその埋め込み
+        """
+        if not self._usable():
+            return [], np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            positions = []
+            for position, doc in enumerate(self.documents):
+                if doc.metadata.get("role") == SUMMARY_ROLE:
+                    continue
+                timestamp = last_active(doc.metadata)
+                if timestamp is not None and timestamp < cutoff:
+                    positions.append(position)
+                    if len(positions) >= limit:
+                        break
+            if not positions:
+                return [], np.empty((0, 0), dtype=np.float32)
+            return [self.documents[p] for p in positions], self.embeddings.take(positions)
+
+    def replace_documents(self, replacements: List[Tuple[List[int], str, Dict[str, Any]]]) -> int:
+        """
+        複数の記憶を1つの要約ドキュメントに置き換える
+
+        置き換えた元の記憶はアーカイブに追記し、インデックスは残った埋め込みから
+        作り直す（再エンコードは要約文のみ）。最後にスナップショットを作成する。
+
+        Args:
+            replacements: (置き換える記憶IDのリスト, 要約文, 要約のメタデータ) のリスト
+
+        Returns:
+            int: インデックスから外した記憶の件数
+        """
+        if not replacements:
+            return 0
+        if not self._usable():
+            return 0
+        summary_vectors = self._encode([summary for _, summary, _ in replacements])
+
+        with self._lock:
+            retire_ids = {doc_id for ids, _, _ in replacements for doc_id in ids if doc_id in self._positions}
+            keep = [p for p, doc in enumerate(self.documents) if doc.id not in retire_ids]
+            retired = [doc for doc in self.documents if doc.id in retire_ids]
+            summaries = []
+            for _, summary, meta in replacements:
+                summaries.append(Document(page_content=summary, metadata=meta, id=self._next_id))
+                self._next_id += 1
+
+            # 元の記憶をアーカイブに残す
+            retired_at = datetime.now().isoformat()
+            with open(self.archive_file, "a", encoding="utf-8") as f:
+                for doc in retired:
+                    f.write(json.dumps({**doc.to_dict(), "retired_at": retired_at}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            kept_vectors = self.embeddings.take(keep) if keep else np.empty((0, summary_vectors.shape[1]), dtype=np.float32)
+            self.documents = [self.documents[p] for p in keep] + summaries
+            self.embeddings.set(np.vstack([kept_vectors, summary_vectors]))
+            self._reindex_documents()
+            if self.store is not None:
+                self.store.set_document_status([doc.id for doc in retired], "retired")
+                self.store.upsert_documents(doc.to_dict() for doc in summaries)
+            if self._lexical is not None:
+                for doc in retired:
+                    self._lexical.remove(doc.id)
+                for doc in summaries:
+                    self._lexical.add(doc.id, doc.page_content)
+            self._build_index_from_embeddings()
+            self._invalidate_results()
+            self.compact()
+        return len(retired)
+
+    def archive_old(self, cutoff: datetime) -> int:
+        """
+        cutoff より前に最後に現れた記憶を月別のコールドシャードに移す
+
+        移した記憶はインデックスから外れるため、通常の検索の件数とコストは
+        保持期間内の記憶の量だけで決まる。要約と記録日時が不明な記憶は残す。
+        シャードへの書き込みが終わってからスナップショットを作り直すため、
+        途中で止まっても記憶が失われることはない（重複して残るだけ）。
+
+        Args:
+            cutoff: これより前に最後に現れた（重複として再び現れた日時、なければ記録日時）記憶を移す
+
+        Returns:
+            int: コールドシャードに移した記憶の件数
+        """
+        if not self._usable():
+            return 0
+        with self._lock:
+            shards: Dict[str, List[int]] = {}
+            for position, doc in enumerate(self.documents):
+                if doc.metadata.get("role") == SUMMARY_ROLE:
+                    continue
+                timestamp = last_active(doc.metadata)
+                if timestamp is not None and timestamp < cutoff:
+                    shards.setdefault(shard_name(timestamp), []).append(position)
+            if not shards:
+                return 0
+
+            for name, positions in shards.items():
+                self.cold_shards.append(
+                    name, [self.documents[p].to_dict() for p in positions], self.embeddings.take(positions)
+                )
+                if self.store is not None:
+                    self.store.set_document_status([self.documents[p].id for p in positions], "cold", shard=name)
+
+            moved = {p for positions in shards.values() for p in positions}
+            self._remove_positions(moved)
+        return len(moved)
+
+    def compact_records(self) -> int:
+        """
+        削除済みの記憶をスナップショットから取り除く
+
+        アーカイブ中に停止してコールドシャードにも残っている記憶と、
+        ID が重複した記憶（先に現れたものを残す）を対象にする。
+
+        Returns:
+            int: 取り除いた記憶の件数
+        """
+        self.wait_until_ready()
+        with self._lock:
+            archived_ids = self.cold_shards.document_ids()
+            seen = set()
+            removed = set()
+            for position, doc in enumerate(self.documents):
+                if doc.id in seen or doc.id in archived_ids:
+                    removed.add(position)
+                seen.add(doc.id)
+            if removed:
+                self._remove_positions(removed)
+            else:
+                self.compact()
+        return len(removed)
+
+    def rebuild_index(self) -> None:
+        """保存済みの埋め込みからインデックスを作り直して保存する（再エンコード不要）"""
+        self.wait_until_ready()
+        with self._lock:
+            self._build_index_from_embeddings()
+            self._invalidate_results()
+            self.compact()
+
+    def _remove_positions(self, positions: set) -> None:
+        """指定した位置の記憶を取り除き、インデックスとスナップショットを作り直す（ロック内で呼ぶ）"""
+        keep = [p for p in range(len(self.documents)) if p not in positions]
+        if self._lexical is not None:
+            for p in positions:
+                self._lexical.remove(self.documents[p].id)
+        kept_vectors = self.embeddings.take(keep) if keep else np.empty((0, self.embeddings.dimension), dtype=np.float32)
+        self.documents = [self.documents[p] for p in keep]
+        self.embeddings.set(kept_vectors)
+        self._reindex_documents()
+        self._build_index_from_embeddings()
+        self._invalidate_results()
+        self.compact()
+
+    def query_documents(self, start: Optional[str] = None, end: Optional[str] = None,
+                        author: Optional[str] = None, role: Optional[str] = None,
+                        limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        期間（ISO 形式の start 以上 end 未満）・投稿者・話者で記憶を探す（新しい順）
+
+        SQLite ストアがある場合はコールドシャードや要約に統合済みの記憶も含めて
+        インデックスで検索し、ない場合は保持中の記憶だけを走査する。
+
+        Returns:
+            List[Dict[str, Any]]: Document.to_dict() の形式に status（hot / cold / retired）を加えた辞書のリスト
+        """
+        if self.store is not None:
+            return self.store.query_documents(start, end, author, role, limit=limit)
+        if not self._usable():
+            return []
+        with self._lock:
+            matched = [
+                {**doc.to_dict(), "status": "hot"} for doc in self.documents
+                if (author is None or partition_key(doc.metadata) == author)
+                and (role is None or doc.metadata.get("role") == role)
+                and (start is None or (doc.metadata.get("timestamp") or "") >= start)
+                and (end is None or (doc.metadata.get("timestamp") or "") < end)
+            ]
+        matched.sort(key=lambda doc: doc["metadata"].get("timestamp") or "", reverse=True)
+        return matched[:limit]
+
+    def search_cold(self, query: str, top_k: int = 5, shards: Optional[List[str]] = None,
+                    min_similarity: Optional[float] = None) -> List[MemoryHit]:
+        """
+        コールドシャードを検索する
+
+        Args:
+            query: 検索クエリ
+            top_k: 取得する最大件数
+            shards: 検索するシャード名（"YYYY-MM"、None の場合はすべて）
+            min_similarity: コサイン類似度の下限（None の場合はインスタンスの設定値）
+
+        Returns:
+            List[MemoryHit]: 検索結果（類似度の高い順、metadata の "shard" にシャード名を入れる）
+        """
+        if not self._usable():
+            return []
+        if min_similarity is None:
+            min_similarity = self.min_similarity
+        query_embedding = self._encode_query(query, normalize_query(query))
+        return [
+            MemoryHit(id=doc.get("id"), text=doc["page_content"],
+                      metadata={**doc.get("metadata", {}), "shard": name}, score=score)
+            for name, doc, score in self.cold_shards.search(query_embedding[0], top_k, shards)
+            if score >= min_similarity
+        ]
+
+    def _invalidate_results(self) -> None:
+        """記憶の内容が変わったので検索結果キャッシュを無効化する"""
+        self._generation += 1
+        self._result_cache.clear()
+
+    def _encode_query(self, query: str, key: str) -> np.ndarray:
+        """クエリの埋め込みを取得（キャッシュがあれば再計算しない）"""
+        embedding = self._embedding_cache.get(key)
+        if embedding is None:
+            embedding = self._encode([query])
+            self._embedding_cache.put(key, embedding)
+        return embedding
+
+    def retrieve(self, query: str, top_k: int = 5, min_similarity: Optional[float] = None,
+                 author: Optional[str] = None) -> List[MemoryHit]:
+        """
+        質問に関連するコンテキストを RAG で取得
+
+        Args:
+            query: 検索クエリ
+            top_k: 取得する最大件数
+            min_similarity: コサイン類似度の下限（None の場合はインスタンスの設定値）
+            author: 質問者（再ランキングで本人に関する記憶を優先する）
+
+        Returns:
+            List[MemoryHit]: 検索結果（再ランキング有効時は rank_score の高い順、
+                無効時は語彙検索との融合スコア、語彙検索も無効なら類似度の高い順）
+        """
+        if not self._usable():
+            return []
         if not self.documents or self.index is None:
             return []
+        if min_similarity is None:
+            min_similarity = self.min_similarity
 
-        # クエリの埋め込みを計算
-        query_embedding = self.embed_model.encode([query], convert_to_numpy=True)
-        
-        # 類似度検索
-        distances, indices = self.index.search(query_embedding, top_k)
-        
-        # 結果を返す
-        return [self.documents[i].page_content for i in indices[0]] 
\ No newline at end of file
+        # 再ランキングする場合は多めに候補を取る
+        fetch_k = top_k * self.rerank_weights.overfetch if self.rerank_weights else top_k
+
+        key = normalize_query(query)
+        generation = self._generation
+        cached = self._result_cache.get((key, fetch_k, generation))
+        if cached is None:
+            # クエリの埋め込みを計算
+            query_embedding = self._encode_query(query, key)
+            
+            # 類似度検索（追加処理と同時にインデックスを触らないようにロックする）
+            with self._lock:
+                generation = self._generation
+                # 量子化したインデックスでも類似度の下限は正確なコサイン類似度で判定する
+                cached = tuple(
+                    self._to_hit(position, score)
+                    for position, score in search_rescored(self.index, query_embedding, fetch_k, self.embeddings.take)
+                )
+                if self._lexical is not None:
+                    cached = self._fuse_lexical(cached, query, query_embedding, fetch_k)
+
+            # 検索中に記憶が追加されていても古い世代のキーで保存されるだけなので再利用されない
+            self._result_cache.put((key, fetch_k, generation), cached)
+
+        # 関連の薄い記憶はプロンプトに含めない（語彙が強く一致した記憶は残す）
+        hits = [
+            hit for hit in cached
+            if hit.score >= min_similarity or (hit.lexical_score or 0.0) >= self.lexical_min_score
+        ]
+        if self.rerank_weights:
+            hits = rerank(hits, self.rerank_weights, self._access_counts, author=author)
+        hits = hits[:top_k]
+
+        for hit in hits:
+            self._access_counts[hit.id] = self._access_counts.get(hit.id, 0) + 1
+        return hits
+
+    def retrieve_author(self, query: str, author: str, top_k: int = 3,
+                        min_similarity: Optional[float] = None) -> List[MemoryHit]:
+        """
+        特定の視聴者に関する記憶だけを検索する
+
+        全体のインデックスは使わず、その視聴者の直近 author_partition_limit 件の
+        埋め込みとだけ内積を取るため、記憶全体の件数に関係なく検索コストが一定に収まる。
+
+        Args:
+            query: 検索クエリ
+            author: 視聴者（コメントの投稿者）
+            top_k: 取得する最大件数
+            min_similarity: コサイン類似度の下限（None の場合はインスタンスの設定値）
+
+        Returns:
+            List[MemoryHit]: 検索結果（再ランキング有効時は rank_score の高い順、無効時は類似度の高い順）
+        """
+        if not self._usable():
+            return []
+        if author not in self._author_ids:
+            return []
+        if min_similarity is None:
+            min_similarity = self.min_similarity
+        fetch_k = top_k * self.rerank_weights.overfetch if self.rerank_weights else top_k
+
+        key = normalize_query(query)
+        generation = self._generation
+        cached = self._result_cache.get((key, fetch_k, generation, author))
+        if cached is None:
+            query_embedding = self._encode_query(query, key)
+            with self._lock:
+                generation = self._generation
+                positions = [
+                    self._positions[doc_id]
+                    for doc_id in self._author_ids.get(author, [])[-self.author_partition_limit:]
+                    if doc_id in self._positions
+                ]
+                if positions:
+                    scores = self.embeddings.take(positions) @ query_embedding[0]
+                    order = np.argsort(-scores, kind="stable")[:fetch_k]
+                    cached = tuple(self._to_hit(positions[i], float(scores[i])) for i in order)
+                else:
+                    cached = ()
+            self._result_cache.put((key, fetch_k, generation, author), cached)
+
+        hits = [hit for hit in cached if hit.score >= min_similarity]
+        if self.rerank_weights:
+            hits = rerank(hits, self.rerank_weights, self._access_counts, author=author)
+        hits = hits[:top_k]
+
+        for hit in hits:
+            self._access_counts[hit.id] = self._access_counts.get(hit.id, 0) + 1
+        return hits
+
+    def _fuse_lexical(self, vector_hits: Tuple[MemoryHit, ...], query: str, query_embedding: np.ndarray,
+                      fetch_k: int) -> Tuple[MemoryHit, ...]:
+        """
+        ベクトル検索の候補と BM25 の候補を逆順位融合する（ロック内で呼ぶ）
+
+        語彙検索だけでヒットした記憶は、保存済みの埋め込みとの内積で類似度を補う。
+        """
+        lexical = [(doc_id, score) for doc_id, score in self._lexical.search(query, fetch_k, normalize=True)
+                   if doc_id in self._positions]
+        hits = {hit.id: hit for hit in vector_hits}
+        lexical_only = [self._positions[doc_id] for doc_id, _ in lexical if doc_id not in hits]
+        if lexical_only:
+            similarities = self.embeddings.take(lexical_only) @ query_embedding[0]
+            for position, similarity in zip(lexical_only, similarities):
+                hit = self._to_hit(position, float(similarity))
+                hits[hit.id] = hit
+        for doc_id, score in lexical:
+            hits[doc_id].lexical_score = score
+
+        fused = reciprocal_rank_fusion([[hit.id for hit in vector_hits], [doc_id for doc_id, _ in lexical]])
+        for doc_id, score in fused.items():
+            # 両方の検索で1位なら 1 になるよう正規化する
+            hits[doc_id].relevance = score * (RRF_K + 1) / 2
+        return tuple(sorted(hits.values(), key=lambda hit: hit.relevance, reverse=True))
+
+    def _to_hit(self, position: int, score: float) -> MemoryHit:
+        """インデックス上の位置から検索結果を作る"""
+        doc = self.documents[position]
+        return MemoryHit(id=doc.id, text=doc.page_content, metadata=doc.metadata, score=score)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """キャッシュのヒット率などを取得する（監視用）"""
+        return {
+            "query_embedding": self._embedding_cache.stats(),
+            "results": self._result_cache.stats()
+        }
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """専用スレッドプールで同期処理を実行する"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def aadd(self, text: str, meta: Dict | None = None) -> None:
+        """add の非同期版（イベントループをブロックしない）"""
+        await self.run_in_executor(self.add, text, meta)
+
+    async def aadd_many(self, texts: List[str], metas: List[Dict] | None = None) -> None:
+        """add_many の非同期版（イベントループをブロックしない）"""
+        await self.run_in_executor(self.add_many, texts, metas)
+
+    async def aretrieve(self, query: str, top_k: int = 5, min_similarity: Optional[float] = None,
+                        author: Optional[str] = None) -> List[MemoryHit]:
+        """retrieve の非同期版（イベントループをブロックしない）"""
+        return await self.run_in_executor(self.retrieve, query, top_k, min_similarity, author)
+
+    async def aretrieve_author(self, query: str, author: str, top_k: int = 3,
+                               min_similarity: Optional[float] = None) -> List[MemoryHit]:
+        """retrieve_author の非同期版（イベントループをブロックしない）"""
+        return await self.run_in_executor(self.retrieve_author, query, author, top_k, min_similarity)
+
+    async def asearch_cold(self, query: str, top_k: int = 5, shards: Optional[List[str]] = None,
+                           min_similarity: Optional[float] = None) -> List[MemoryHit]:
+        """search_cold の非同期版（イベントループをブロックしない）"""
+        return await self.run_in_executor(self.search_cold, query, top_k, shards, min_similarity)
+
+    async def aflush(self) -> None:
+        """flush の非同期版（イベントループをブロックしない）"""
+        await self.run_in_executor(self.flush)
@@ -0,0 +1,210 @@
+"""FAISS インデックスの生成（厳密検索 / 近似最近傍検索の切り替え）"""
+
+import math
+from typing import Callable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# 利用可能なインデックス種別
+INDEX_TYPES = ("flat", "hnsw", "ivf", "auto")
+
+# HNSW のパラメータ
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# IVF のパラメータ（学習にはクラスタ数の数十倍のベクトルが必要）
+IVF_MIN_TRAIN_PER_LIST = 39
+IVF_NPROBE = 8
+
+# ベクトルの保存形式
+STORAGE_TYPES = ("float32", "float16", "pq")
+
+# 直積量子化（PQ）のパラメータ（8bit のコードブックは 256 個の重心を持ち、
+# faiss は重心あたり 39 件以上の学習データを求める。それまでは float16 で代用する）
+PQ_MAX_SUBQUANTIZERS = 64
+PQ_NBITS = 8
+PQ_MIN_TRAIN_PER_CENTROID = 39
+PQ_MIN_TRAIN = PQ_MIN_TRAIN_PER_CENTROID * 2 ** PQ_NBITS
+
+# 量子化したインデックス（float16 / pq）の類似度は近似値なので、この倍率だけ多めに候補を取り、
+# 元の埋め込みとの内積で計算し直してから上位を選ぶ
+RESCORE_OVERFETCH = 8
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """コサイン類似度を内積で計算できるよう各ベクトルを単位長にする"""
+    vectors = np.array(vectors, dtype=np.float32, copy=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def is_normalized(vectors: np.ndarray, tolerance: float = 1e-2) -> bool:
+    """すべてのベクトルが単位長か"""
+    return bool(np.all(np.abs(np.linalg.norm(vectors, axis=1) - 1.0) <= tolerance))
+
+
+def index_kind(index: Optional[faiss.Index]) -> str:
+    """インデックスの種別名を返す"""
+    if index is None:
+        return "none"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def resolve_index_type(index_type: str, count: int, ann_threshold: int) -> str:
+    """
+    設定値と件数から実際に使うインデックス種別を決める
+
+    Args:
+        index_type: "flat" / "hnsw" / "ivf" / "auto"
+        count: 登録するベクトル数
+        ann_threshold: "auto" のとき近似検索に切り替える件数
+
+    Returns:
+        str: "flat" / "hnsw" / "ivf" のいずれか
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"無効なインデックス種別: {index_type}")
+    if index_type == "auto":
+        return "hnsw" if count >= ann_threshold else "flat"
+    if index_type == "ivf" and count < IVF_MIN_TRAIN_PER_LIST:
+        # 学習データが足りない間は厳密検索で代用する
+        return "flat"
+    return index_type
+
+
+def index_storage(index: Optional[faiss.Index]) -> str:
+    """インデックスが保持しているベクトルの保存形式を返す"""
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer, faiss.IndexHNSWSQ)):
+        return "float16"
+    return "float32"
+
+
+def resolve_storage(storage: str, kind: str, count: int) -> str:
+    """
+    設定値とインデックス種別・件数から実際に使う保存形式を決める
+
+    PQ は HNSW と組み合わせられず、学習データが足りない間も使えないため、
+    その場合は float16 で代用する。
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"無効な保存形式: {storage}")
+    if storage == "pq" and (kind == "hnsw" or count < PQ_MIN_TRAIN):
+        return "float16"
+    return storage
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """次元数を割り切れる最大のサブ量子化器数"""
+    for m in range(min(PQ_MAX_SUBQUANTIZERS, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def ivf_nlist(count: int) -> int:
+    """件数に応じた IVF のクラスタ数"""
+    return max(1, min(int(4 * math.sqrt(count)), count // IVF_MIN_TRAIN_PER_LIST))
+
+
+def needs_retrain(index: faiss.Index, count: int, trained_count: Optional[int] = None) -> bool:
+    """
+    学習時より件数が大きく増え、学習し直す必要があるか
+
+    IVF はクラスタ数が不足したとき、PQ はコードブックを学習した件数（trained_count）の
+    2倍に達したとき（後から追加した記憶の分布がコードブックに反映されていないため）。
+    """
+    if isinstance(index, faiss.IndexIVF) and index.nlist * 2 <= ivf_nlist(count):
+        return True
+    return index_storage(index) == "pq" and trained_count is not None and count >= trained_count * 2
+
+
+def search_rescored(index: faiss.Index, query: np.ndarray, k: int,
+                    take: Callable[[List[int]], np.ndarray]) -> List[Tuple[int, float]]:
+    """
+    インデックスを検索し、(位置, コサイン類似度) を類似度の高い順に返す
+
+    量子化したインデックスでは RESCORE_OVERFETCH 倍の候補を取り、take で取り出した
+    元の埋め込みとの内積で類似度を計算し直す（類似度の閾値や重複判定を正確な値で行う）。
+
+    Args:
+        index: 検索するインデックス
+        query: クエリのベクトル（shape=(1, d)）
+        k: 取得する最大件数
+        take: 位置のリストから元の埋め込み（float32）を返す関数
+    """
+    exact = index_storage(index) == "float32"
+    scores, indices = index.search(query, k if exact else k * RESCORE_OVERFETCH)
+    # 件数が足りない場合は -1 が返るので除く
+    candidates = [(int(i), float(score)) for score, i in zip(scores[0], indices[0]) if i >= 0]
+    if exact or not candidates:
+        return candidates
+    positions = [position for position, _ in candidates]
+    similarities = take(positions) @ np.asarray(query[0], dtype=np.float32)
+    order = np.argsort(-similarities, kind="stable")[:k]
+    return [(positions[i], float(similarities[i])) for i in order]
+
+
+def build_index(kind: str, vectors: np.ndarray, metric: int = faiss.METRIC_INNER_PRODUCT,
+                storage: str = "float32") -> faiss.Index:
+    """
+    指定した種別のインデックスを作成してベクトルを登録する
+
+    Args:
+        kind: "flat" / "hnsw" / "ivf"
+        vectors: 登録するベクトル（shape=(n, d)）
+        metric: faiss.METRIC_L2 または faiss.METRIC_INNER_PRODUCT
+        storage: "float32" / "float16" / "pq"（resolve_storage で解決済みの値）
+
+    Returns:
+        faiss.Index: 作成したインデックス
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+    fp16 = faiss.ScalarQuantizer.QT_fp16
+
+    if kind == "hnsw":
+        if storage == "float32":
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, metric)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, fp16, HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == "ivf":
+        nlist = ivf_nlist(len(vectors))
+        if metric == faiss.METRIC_INNER_PRODUCT:
+            quantizer = faiss.IndexFlatIP(dimension)
+        else:
+            quantizer = faiss.IndexFlatL2(dimension)
+        if storage == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_subquantizers(dimension), PQ_NBITS, metric)
+        elif storage == "float16":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, fp16, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+        index.nprobe = min(IVF_NPROBE, nlist)
+    elif kind == "flat":
+        if storage == "pq":
+            index = faiss.IndexPQ(dimension, pq_subquantizers(dimension), PQ_NBITS, metric)
+        elif storage == "float16":
+            index = faiss.IndexScalarQuantizer(dimension, fp16, metric)
+        elif metric == faiss.METRIC_INNER_PRODUCT:
+            index = faiss.IndexFlatIP(dimension)
+        else:
+            index = faiss.IndexFlatL2(dimension)
+    else:
+        raise ValueError(f"無効なインデックス種別: {kind}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    if len(vectors):
+        index.add(vectors)
+    return index
@@ -0,0 +1,137 @@
+"""文字 n-gram の転置インデックスによる BM25 検索"""
+
+import math
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+# 日本語は単語の区切りがないため文字 bigram を索引語にする
+NGRAM_SIZE = 2
+
+# 逆順位融合（Reciprocal Rank Fusion）の定数
+RRF_K = 60
+
+
+def tokenize(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    """
+    テキストを文字 n-gram に分割する
+
+    空白で区切られた語をまたぐ n-gram は作らない。n 文字に満たない語はそのまま1語とする。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for word in text.split():
+        if len(word) <= n:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> Dict[Hashable, float]:
+    """
+    複数の順位付きリストを逆順位融合する
+
+    Args:
+        rankings: 各検索手法の結果 ID（良い順）
+        k: 下位の順位の影響を抑える定数
+
+    Returns:
+        Dict[Hashable, float]: ID → 融合スコア（各リストで1位なら 1/(k+1) ずつ加算）
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+class BM25Index:
+    """追加・削除に追随する BM25 の転置インデックス"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = {}  # 索引語 → {文書ID: 出現回数}
+        self._doc_terms: Dict[Hashable, Counter] = {}
+        self._doc_lengths: Dict[Hashable, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc_id: Hashable, text: str) -> None:
+        """文書を追加する（同じ ID が既にあれば置き換える）"""
+        terms = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._doc_terms:
+                self._remove_locked(doc_id)
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._total_length += self._doc_lengths[doc_id]
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id: Hashable) -> None:
+        """文書を削除する"""
+        with self._lock:
+            if doc_id in self._doc_terms:
+                self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: Hashable) -> None:
+        terms = self._doc_terms.pop(doc_id)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def clear(self) -> None:
+        """全文書を削除する"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+
+    def search(self, query: str, top_k: int = 10, normalize: bool = False) -> List[Tuple[Hashable, float]]:
+        """
+        BM25 で検索する
+
+        クエリに含まれる索引語の転置リストだけをたどるため、
+        計算量は文書数ではなくヒットした文書数に比例する。
+
+        Args:
+            query: 検索クエリ
+            top_k: 取得する最大件数
+            normalize: スコアをクエリの全索引語が1回ずつ一致した場合のスコアで割り、0〜1 にする
+                （クエリの情報量のうち一致した割合。クエリや記憶の件数によらず同じ閾値で比較できる）
+
+        Returns:
+            List[Tuple[Hashable, float]]: (文書ID, スコア) のリスト（スコアの高い順）
+        """
+        query_terms = Counter(tokenize(query))
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count or not query_terms:
+                return []
+            average_length = self._total_length / doc_count
+            scores: Dict[Hashable, float] = {}
+            ideal = 0.0
+            for term, query_count in query_terms.items():
+                posting = self._postings.get(term) or {}
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                # 平均的な長さの文書に1回だけ現れた場合の寄与は idf になる
+                ideal += query_count * idf
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + query_count * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        if normalize:
+            ranked = [(doc_id, min(score / ideal, 1.0) if ideal > 0 else 0.0) for doc_id, score in ranked]
+        return ranked
@@ -0,0 +1,178 @@
+"""長期記憶の追記型ジャーナル（write-behind 永続化）"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    """埋め込みベクトルを JSON に載せられる文字列へ変換"""
+    return base64.b64encode(np.ascontiguousarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> np.ndarray:
+    """encode_vector で変換した文字列をベクトルに戻す"""
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def temp_path(path: Path) -> Path:
+    """path を置き換える前に書き込む一時ファイル"""
+    return path.with_name(path.name + ".tmp")
+
+
+def atomic_write(path: Path, writer: Callable[[Path], None]) -> None:
+    """一時ファイルに書き込んでから置き換える（書き込み途中のファイルを残さない）"""
+    tmp_path = temp_path(path)
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def file_checksum(path: Path, chunk_size: int = 1 << 20) -> str:
+    """ファイルの SHA-256（スナップショットの整合性確認用）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MemoryJournal:
+    """
+    ドキュメントと埋め込みを1行1レコードで追記するジャーナル
+
+    append されたレコードはメモリ上にバッファされ、件数が batch_size に
+    達したとき、または flush_interval 秒ごとにまとめてファイルへ書き出される。
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 5.0, batch_size: int = 16,
+                 after_flush: Optional[Callable[[int], None]] = None):
+        """
+        初期化
+
+        Args:
+            path: ジャーナルファイルのパス
+            flush_interval: 定期フラッシュの間隔（秒）
+            batch_size: この件数たまったら即座にフラッシュする
+            after_flush: フラッシュ後にジャーナル内の総レコード数を受け取るコールバック
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.after_flush = after_flush
+        self.record_count = 0  # ファイルに書き出し済みのレコード数
+
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """定期フラッシュ用のスレッドを開始する"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """定期フラッシュを止め、残りのレコードを書き出す"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"記憶ジャーナルのフラッシュエラー: {e}")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """レコードをバッファに追加する"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._pending.append(line)
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        バッファされたレコードをファイルに追記する
+
+        Returns:
+            int: 書き出したレコード数
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            lines = self._pending
+            self._pending = []
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.record_count += len(lines)
+            total = self.record_count
+
+        # コールバックはロックの外で呼ぶ（コンパクション中の append と競合させない）
+        if self.after_flush:
+            self.after_flush(total)
+        return len(lines)
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """
+        ジャーナルの内容を読み込む
+
+        書き込み途中で中断された末尾行は破棄する。
+
+        Returns:
+            List[Dict[str, Any]]: 書き込み順のレコード
+        """
+        records: List[Dict[str, Any]] = []
+        if not self.path.exists():
+            return records
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        # 改行で終わっていない末尾は書き込み途中のレコードなので切り捨てる
+        valid_length = data.rfind(b"\n") + 1
+        if valid_length < len(data):
+            logger.warning(f"記憶ジャーナルの不完全な末尾レコードを破棄しました: {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_length)
+
+        for line_no, line in enumerate(data[:valid_length].decode("utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"記憶ジャーナルの破損行を読み飛ばしました: {self.path}:{line_no}")
+        self.record_count = len(records)
+        return records
+
+    def reset(self) -> None:
+        """
+        スナップショット作成後にジャーナルを空にする
+
+        呼び出し側はスナップショットに全レコードの内容が含まれていることを
+        保証すること（未フラッシュのバッファも破棄する）。
+        """
+        with self._lock:
+            atomic_write(self.path, lambda p: p.write_text("", encoding="utf-8"))
+            self._pending = []
+            self.record_count = 0
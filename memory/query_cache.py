@@ -0,0 +1,74 @@
+"""クエリ埋め込み・検索結果用の LRU キャッシュ"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_query(text: str) -> str:
+    """キャッシュキー用にクエリを正規化（全角半角・大文字小文字・空白の揺れを吸収）"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LRUCache:
+    """件数上限と有効期限（TTL）付きのスレッドセーフな LRU キャッシュ"""
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = 600.0):
+        """
+        初期化
+
+        Args:
+            max_size: 保持する最大件数（0 以下でキャッシュ無効）
+            ttl: 有効期限（秒）。None の場合は期限なし
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """キャッシュから取得する（見つからない・期限切れの場合は None）"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """キャッシュに保存する（上限を超えたら最も古いものを捨てる）"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """全エントリを破棄する（統計は残す）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計を取得する"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -0,0 +1,88 @@
+"""検索結果の再ランキング（新しさ・話者・投稿者・参照頻度による重み付け）"""
+
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from memory.consolidation import last_active
+
+
+@dataclass
+class RerankWeights:
+    """再ランキングの重み"""
+    overfetch: int = 4  # top_k の何倍の候補を取得して並べ替えるか
+    similarity: float = 1.0  # コサイン類似度の重み
+    relevance: float = 0.2  # ベクトル検索と語彙検索の融合スコア（0〜1、語彙検索が無効なら 0）の重み
+    recency: float = 0.2  # 新しさ（半減期で減衰する 0〜1 の値）の重み
+    recency_half_life_hours: float = 72.0
+    frequency: float = 0.05  # log(1 + 出現回数 + 参照回数) の重み
+    author: float = 0.1  # 質問者本人に関する記憶の加点
+    role_weights: Dict[str, float] = field(default_factory=lambda: {"user": 0.05, "assistant": 0.0, "summary": 0.1})
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RerankWeights':
+        return cls(**data)
+
+
+def rerank(hits: List, weights: RerankWeights, access_counts: Dict[int, int],
+           author: Optional[str] = None, now: Optional[datetime] = None) -> List:
+    """
+    候補の検索結果を重み付きスコアで並べ替える
+
+    各特徴量を候補全体の配列として計算するため、候補数が数十件でも
+    Python のループは特徴量の取り出しだけで済む。
+
+    Args:
+        hits: MemoryHit のリスト
+        weights: 再ランキングの重み
+        access_counts: 記憶ID → これまでに検索結果として返した回数
+        author: 質問者（一致する投稿者の記憶を加点）
+        now: 基準時刻（省略時は現在時刻）
+
+    Returns:
+        List: rank_score を設定し、降順に並べ替えた MemoryHit のリスト
+    """
+    if not hits:
+        return hits
+    now = now or datetime.now()
+
+    # 融合スコアは順位から決まる値（1位でも片方の検索だけなら 0.5、20位で 0.38）で差が小さく、
+    # 類似度の代わりに使うと新しさや話者の重みが相対的に大きくなりすぎるため、別の特徴量として加える
+    similarity = np.fromiter((hit.score for hit in hits), dtype=np.float64, count=len(hits))
+    relevance = np.fromiter(
+        (hit.relevance if hit.relevance is not None else 0.0 for hit in hits),
+        dtype=np.float64, count=len(hits)
+    )
+
+    # 最後に現れた日時（重複として再び現れた日時、なければ記録日時）で新しさを測り、不明な記憶は新しさ 0 として扱う
+    ages = np.fromiter(
+        ((now - ts).total_seconds() / 3600 if (ts := last_active(hit.metadata)) else np.inf for hit in hits),
+        dtype=np.float64, count=len(hits)
+    )
+    recency = np.exp2(-np.maximum(ages, 0.0) / weights.recency_half_life_hours)
+
+    frequency = np.log1p(np.fromiter(
+        (hit.metadata.get("hit_count", 1) - 1 + access_counts.get(hit.id, 0) for hit in hits),
+        dtype=np.float64, count=len(hits)
+    ))
+    role = np.fromiter(
+        (weights.role_weights.get(hit.metadata.get("role"), 0.0) for hit in hits),
+        dtype=np.float64, count=len(hits)
+    )
+    same_author = np.fromiter(
+        (author is not None and hit.metadata.get("author") == author for hit in hits),
+        dtype=np.float64, count=len(hits)
+    )
+
+    scores = (weights.similarity * similarity
+              + weights.relevance * relevance
+              + weights.recency * recency
+              + weights.frequency * frequency
+              + role
+              + weights.author * same_author)
+
+    # キャッシュされた検索結果を書き換えないようコピーして返す
+    order = np.argsort(-scores, kind="stable")
+    return [replace(hits[i], rank_score=float(scores[i])) for i in order]
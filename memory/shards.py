@@ -0,0 +1,164 @@
+"""保持期間を過ぎた記憶を月ごとのコールドシャードに移す"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from memory.memory_journal import atomic_write
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# コールドシャードの検索で一度に float32 へ変換する行数
+SEARCH_CHUNK_ROWS = 65536
+
+
+def shard_name(timestamp: datetime) -> str:
+    """記録日時が属するシャード名（"YYYY-MM"）"""
+    return timestamp.strftime("%Y-%m")
+
+
+class ColdShardStore:
+    """
+    月ごとのシャードをディレクトリに分けて保存する
+
+    シャードは通常の検索対象に含めず、明示的に検索したときだけ
+    埋め込みをメモリマップで開いて全件比較する。
+    """
+
+    def __init__(self, root: Path, dtype: str = "float16"):
+        """
+        初期化
+
+        Args:
+            root: シャードを置くディレクトリ
+            dtype: 埋め込みの保存型（参照頻度が低いため既定で float16）
+        """
+        self.root = Path(root)
+        self.dtype = np.dtype(dtype)
+
+    def list_shards(self) -> List[str]:
+        """保存済みのシャード名（古い順）"""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / "documents.json").exists())
+
+    def document_ids(self) -> set:
+        """全シャードに保存済みの記憶ID"""
+        ids = set()
+        for name in self.list_shards():
+            documents, _ = self._load(name)
+            ids.update(doc.get("id") for doc in documents if doc.get("id") is not None)
+        return ids
+
+    def _load(self, name: str, mmap: bool = True) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+        """シャードを読み込む（件数が食い違う場合は短い方に揃える）"""
+        shard_dir = self.root / name
+        documents_file = shard_dir / "documents.json"
+        embeddings_file = shard_dir / "embeddings.npy"
+        if not documents_file.exists() or not embeddings_file.exists():
+            return [], None
+        with open(documents_file, "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        vectors = np.load(embeddings_file, mmap_mode="r" if mmap else None)
+        count = min(len(documents), len(vectors))
+        return documents[:count], vectors[:count]
+
+    def append(self, name: str, documents: Sequence[Dict[str, Any]], vectors: np.ndarray) -> None:
+        """
+        シャードに記憶を追加する
+
+        埋め込みを先に書き、ドキュメントを後に書く。途中で止まっても
+        読み込み時に短い方へ揃えるため、ドキュメントのない埋め込みは無視される。
+        """
+        shard_dir = self.root / name
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        existing_docs, existing_vectors = self._load(name, mmap=False)
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if existing_vectors is not None and len(existing_vectors):
+            vectors = np.vstack([existing_vectors.astype(self.dtype), vectors])
+        all_docs = list(existing_docs) + list(documents)
+
+        def write_embeddings(path: Path):
+            with open(path, "wb") as f:
+                np.save(f, vectors)
+
+        def write_documents(path: Path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(all_docs, f, ensure_ascii=False, indent=2)
+
+        atomic_write(shard_dir / "embeddings.npy", write_embeddings)
+        atomic_write(shard_dir / "documents.json", write_documents)
+
+    def search(self, query_vector: np.ndarray, top_k: int,
+               shards: Optional[Sequence[str]] = None) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        シャードを全件比較で検索する
+
+        Args:
+            query_vector: 正規化済みのクエリベクトル（shape=(d,)）
+            top_k: 取得する最大件数
+            shards: 検索するシャード名（None の場合はすべて）
+
+        Returns:
+            List[Tuple[str, Dict[str, Any], float]]: (シャード名, ドキュメント, コサイン類似度) のリスト（類似度の高い順）
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        results = []
+        for name in (shards if shards is not None else self.list_shards()):
+            documents, vectors = self._load(name)
+            if not documents:
+                continue
+            # float16 のまま内積を取ると遅いため、一定行数ずつ float32 に戻して計算する
+            scores = np.concatenate([
+                np.asarray(vectors[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32) @ query_vector
+                for start in range(0, len(vectors), SEARCH_CHUNK_ROWS)
+            ])
+            for i in np.argsort(-scores, kind="stable")[:top_k]:
+                results.append((name, documents[i], float(scores[i])))
+        results.sort(key=lambda item: item[2], reverse=True)
+        return results[:top_k]
+
+
+class MemoryRetention:
+    """保持期間を過ぎた記憶を定期的にコールドシャードへ移すバックグラウンドジョブ"""
+
+    def __init__(self, memory, retention: timedelta, interval: float = 3600.0):
+        """
+        初期化
+
+        Args:
+            memory: 対象の VTuberMemory
+            retention: 通常の検索対象に残す期間
+            interval: 定期実行の間隔（秒）
+        """
+        self.memory = memory
+        self.retention = retention
+        self.interval = interval
+
+    async def run_forever(self) -> None:
+        """interval 秒ごとに保持期間を過ぎた記憶を移す"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"記憶のアーカイブエラー: {e}")
+
+    async def run_once(self) -> int:
+        """
+        アーカイブを1回実行する
+
+        Returns:
+            int: コールドシャードに移した記憶の件数
+        """
+        moved = await self.memory.run_in_executor(self.memory.archive_old, datetime.now() - self.retention)
+        if moved:
+            logger.info(f"保持期間を過ぎた記憶をコールドシャードに移しました ({moved}件)")
+        return moved
@@ -0,0 +1,216 @@
+"""会話履歴・記憶のメタデータ・トリプルを1つの SQLite（WAL モード）に保存する"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    ts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_ts ON history(ts);
+CREATE INDEX IF NOT EXISTS history_role_ts ON history(role, ts);
+
+CREATE TABLE IF NOT EXISTS memory_documents (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    role TEXT,
+    author TEXT,
+    timestamp TEXT,
+    status TEXT NOT NULL DEFAULT 'hot',  -- hot / cold（コールドシャード）/ retired（要約に統合済み）
+    shard TEXT,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memory_documents_timestamp ON memory_documents(timestamp);
+CREATE INDEX IF NOT EXISTS memory_documents_author_timestamp ON memory_documents(author, timestamp);
+CREATE INDEX IF NOT EXISTS memory_documents_role_timestamp ON memory_documents(role, timestamp);
+
+CREATE TABLE IF NOT EXISTS triples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    triple TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS triples_timestamp ON triples(timestamp);
+-- トリプルの検索は MemorySearcher の BM25Index（文字 bigram）で行う
+-- （FTS5 の trigram は3文字未満の語を引けず、「ポチ」のような短い固有名詞が落ちる）
+DROP TRIGGER IF EXISTS triples_ai;
+DROP TRIGGER IF EXISTS triples_ad;
+DROP TABLE IF EXISTS triples_fts;
+"""
+
+
+def _where(conditions: Dict[str, Any], start: Optional[str], end: Optional[str], time_column: str):
+    """等値条件と期間（start 以上 end 未満）から WHERE 句を作る"""
+    clauses = [f"{column} = ?" for column, value in conditions.items() if value is not None]
+    params = [value for value in conditions.values() if value is not None]
+    if start is not None:
+        clauses.append(f"{time_column} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{time_column} < ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class SQLiteStore:
+    """
+    HistoryManager・VTuberMemory・MemorySearcher が共有する SQLite ストア
+
+    複数のスレッド（イベントループ・記憶の専用スレッド・履歴の書き込みスレッド）から
+    使うため、1つの接続をロックで直列化する。WAL モードなので読み取り中も書き込める。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _executemany(self, sql: str, rows: Iterable[Sequence]) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(sql, rows)
+
+    # --- 会話履歴 ---
+
+    def append_turns(self, records: List[Dict[str, Any]]) -> None:
+        """会話をまとめて追加する（records は seq 付き）"""
+        self._executemany(
+            "INSERT OR REPLACE INTO history(seq, role, text, ts) VALUES (?, ?, ?, ?)",
+            [(r["seq"], r["role"], r["text"], r["ts"]) for r in records]
+        )
+
+    def last_turns(self, n: int) -> List[Dict[str, Any]]:
+        """直近 n 件の会話（古い順、seq 付き）"""
+        rows = self._execute("SELECT seq, role, text, ts FROM history ORDER BY seq DESC LIMIT ?", (n,))
+        return [dict(row) for row in reversed(rows)]
+
+    def query_turns(self, start: Optional[str] = None, end: Optional[str] = None, role: Optional[str] = None,
+                    limit: int = 1000) -> List[Dict[str, Any]]:
+        """期間・話者で会話を検索する（古い順）"""
+        where, params = _where({"role": role}, start, end, "ts")
+        rows = self._execute(f"SELECT seq, role, text, ts FROM history{where} ORDER BY seq LIMIT ?", (*params, limit))
+        return [dict(row) for row in rows]
+
+    def history_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM history")[0][0]
+
+    # --- 記憶のメタデータ ---
+
+    def upsert_documents(self, documents: Iterable[Dict[str, Any]], status: str = "hot",
+                         shard: Optional[str] = None) -> None:
+        """記憶を追加・更新する（documents は Document.to_dict() の形式）"""
+        rows = []
+        for doc in documents:
+            metadata = doc.get("metadata", {})
+            rows.append((
+                doc["id"], doc["page_content"], metadata.get("role"),
+                metadata.get("author") or metadata.get("reply_to"), metadata.get("timestamp"),
+                status, shard, json.dumps(metadata, ensure_ascii=False)
+            ))
+        self._executemany(
+            "INSERT OR REPLACE INTO memory_documents(id, text, role, author, timestamp, status, shard, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def update_document_metadata(self, updates: Dict[int, Dict[str, Any]]) -> None:
+        """記憶のメタデータだけを更新する（重複統合による出現回数の更新など）"""
+        self._executemany(
+            "UPDATE memory_documents SET metadata = ? WHERE id = ?",
+            [(json.dumps(metadata, ensure_ascii=False), doc_id) for doc_id, metadata in updates.items()]
+        )
+
+    def set_document_status(self, ids: Iterable[int], status: str, shard: Optional[str] = None) -> None:
+        """記憶の状態を変更する（コールドシャードへの移動・要約への統合）"""
+        self._executemany(
+            "UPDATE memory_documents SET status = ?, shard = ? WHERE id = ?",
+            [(status, shard, doc_id) for doc_id in ids]
+        )
+
+    def document_count(self, status: Optional[str] = None) -> int:
+        where, params = _where({"status": status}, None, None, "timestamp")
+        return self._execute(f"SELECT COUNT(*) FROM memory_documents{where}", params)[0][0]
+
+    def query_documents(self, start: Optional[str] = None, end: Optional[str] = None,
+                        author: Optional[str] = None, role: Optional[str] = None,
+                        status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """期間・投稿者・話者・状態で記憶を検索する（新しい順）"""
+        where, params = _where({"author": author, "role": role, "status": status}, start, end, "timestamp")
+        rows = self._execute(
+            f"SELECT id, text, status, shard, metadata FROM memory_documents{where} "
+            f"ORDER BY timestamp DESC LIMIT ?",
+            (*params, limit)
+        )
+        return [
+            {"id": row["id"], "page_content": row["text"], "status": row["status"], "shard": row["shard"],
+             "metadata": json.loads(row["metadata"])}
+            for row in rows
+        ]
+
+    # --- トリプル ---
+
+    def add_triple(self, triple: str, text: str, timestamp: str) -> int:
+        """トリプルを追加し、その ID を返す"""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO triples(triple, text, timestamp) VALUES (?, ?, ?)", (triple, text, timestamp)
+                )
+        return cursor.lastrowid
+
+    def clear_triples(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM triples")
+
+    def triple_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM triples")[0][0]
+
+    def triple_texts(self) -> List[Dict[str, Any]]:
+        """全トリプルの ID と本文（検索インデックスの構築用）"""
+        return [dict(row) for row in self._execute("SELECT id, text FROM triples ORDER BY id")]
+
+    def get_triples(self, ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        ID を指定してトリプルを取得する
+
+        Returns:
+            Dict[int, Dict[str, Any]]: ID → triple / text / timestamp の辞書
+        """
+        if not ids:
+            return {}
+        rows = self._execute(
+            f"SELECT id, triple, text, timestamp FROM triples WHERE id IN ({', '.join('?' * len(ids))})", list(ids)
+        )
+        return {row["id"]: dict(row) for row in rows}
+
+    def import_triples(self, triples: List[Dict[str, Any]]) -> None:
+        """JSON 形式のトリプルを取り込む（移行用）"""
+        self._executemany(
+            "INSERT INTO triples(triple, text, timestamp) VALUES (?, ?, ?)",
+            [(t["triple"], t["text"], t.get("timestamp", "")) for t in triples]
+        )
@@ -0,0 +1,59 @@
+"""テスト共通のフィクスチャ（埋め込みモデルを読み込まずに記憶ストアを開く）"""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+from memory.hipporag_memory import VTuberMemory
+
+DIMENSION = 16
+
+
+class FakeEncoder:
+    """
+    SentenceTransformer の代わり
+
+    vectors に登録したテキストはそのベクトルを、それ以外はテキストから決まる
+    ランダムなベクトルを返す（同じテキストなら常に同じベクトル）。
+    """
+
+    def __init__(self, vectors=None, dimension: int = DIMENSION):
+        self.vectors = vectors or {}
+        self.dimension = dimension
+
+    def encode(self, texts, convert_to_numpy=True):
+        return np.stack([self._vector(text) for text in texts])
+
+    def _vector(self, text: str) -> np.ndarray:
+        if text in self.vectors:
+            return np.asarray(self.vectors[text], dtype=np.float32)
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+
+@pytest.fixture
+def dimension() -> int:
+    return DIMENSION
+
+
+@pytest.fixture
+def open_memory():
+    """
+    VTuberMemory を開く関数（テスト終了時に閉じる）
+
+    既定では重複統合・類似度の下限・語彙検索を無効にする。キーワード引数で上書きでき、
+    vectors を渡すとそのテキストの埋め込みを固定する。
+    """
+    opened = []
+
+    def open_memory(path, vectors=None, **kwargs) -> VTuberMemory:
+        options = {"dedup_threshold": None, "min_similarity": 0.0, "hybrid": False, **kwargs}
+        memory = VTuberMemory(persist_dir=str(path), background_load=False, load_model=False, **options)
+        memory.embed_model = FakeEncoder(vectors)
+        opened.append(memory)
+        return memory
+
+    yield open_memory
+    for memory in opened:
+        memory.close()
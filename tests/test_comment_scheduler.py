@@ -0,0 +1,79 @@
+"""コメントスケジューラーの期限切れ・溜めすぎの扱いの確認"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from core.comment_scheduler import CommentScheduler
+from core.models import Comment
+
+
+def comment(text: str, age: float = 0.0, priority: str = "normal") -> Comment:
+    return Comment(id=text, author="視聴者", text=text, priority=priority,
+                   timestamp=datetime.now(timezone.utc) - timedelta(seconds=age))
+
+
+def test_stale_comments_are_rejected_before_the_depth_cap():
+    async def run():
+        queue = CommentScheduler(max_age=60, max_depth=3)
+        for i in range(3):
+            queue.put_nowait(comment(f"新しい{i}"))
+        for i in range(5):
+            queue.put_nowait(comment(f"古い{i}", age=120))
+        stats = queue.stats()
+        assert queue.qsize() == 3
+        assert stats["dropped_stale"] == 5
+        assert stats["dropped_shed"] == 0
+        texts = set()
+        while not queue.empty():
+            texts.add((await queue.get()).text)
+            queue.task_done()
+        assert texts == {"新しい0", "新しい1", "新しい2"}
+        await asyncio.wait_for(queue.join(), 1)
+    asyncio.run(run())
+
+
+def test_depth_cap_sheds_the_lowest_priority_comment():
+    async def run():
+        queue = CommentScheduler(max_age=60, max_depth=2)
+        queue.put_nowait(comment("高い", priority="high"))
+        queue.put_nowait(comment("普通1"))
+        queue.put_nowait(comment("普通2"))
+        assert queue.stats()["dropped_shed"] == 1
+        assert (await queue.get()).text == "高い"
+        queue.task_done()
+        assert (await queue.get()).text == "普通1"
+        queue.task_done()
+        await asyncio.wait_for(queue.join(), 1)
+    asyncio.run(run())
+
+
+def test_waiting_comment_overtakes_newer_higher_priority(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("core.comment_scheduler.time.monotonic", lambda: now[0])
+
+    async def run():
+        queue = CommentScheduler()
+        queue.put_nowait(comment("待っていた"))
+        # high の加点 1.0 は aging 0.02 で 50 秒分の待ち時間に相当する
+        now[0] += 60
+        queue.put_nowait(comment("新しい高優先度", priority="high"))
+        queue.put_nowait(comment("新しい普通"))
+        assert [(await queue.get()).text for _ in range(3)] == ["待っていた", "新しい高優先度", "新しい普通"]
+    asyncio.run(run())
+
+
+def test_requeued_comment_keeps_its_waiting_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("core.comment_scheduler.time.monotonic", lambda: now[0])
+
+    async def run():
+        queue = CommentScheduler()
+        queue.put_nowait(comment("戻される"))
+        taken = await queue.get()
+        now[0] += 60
+        queue.put_nowait(comment("後から来た高優先度", priority="high"))
+        # 戻したコメントは投稿からの経過時間で加点し直すので、後から来たものより先になる
+        taken.timestamp -= timedelta(seconds=60)
+        queue.requeue(taken)
+        assert [(await queue.get()).text for _ in range(2)] == ["戻される", "後から来た高優先度"]
+    asyncio.run(run())
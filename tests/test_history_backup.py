@@ -0,0 +1,53 @@
+"""会話履歴の増分バックアップの保持期間と復元の確認"""
+
+import pytest
+
+from core.history_backup import HistoryBackup
+
+
+def turns(start: int, end: int):
+    return [{"role": "user", "text": f"会話{seq}", "seq": seq} for seq in range(start, end + 1)]
+
+
+def make_backup(tmp_path, max_turns=30, retention=3, count=10, size=10) -> HistoryBackup:
+    backup = HistoryBackup(tmp_path, max_turns=max_turns, retention=retention)
+    for i in range(count):
+        backup.backup(turns(i * size + 1, (i + 1) * size), (i + 1) * size)
+    return backup
+
+
+def test_only_points_with_full_window_are_restorable(tmp_path):
+    backup = make_backup(tmp_path)
+    restorable = [i for i in range(len(backup.entries)) if backup.is_restorable(i)]
+    assert [backup.entries[i]["end_seq"] for i in restorable] == [80, 90, 100]
+    # 保持期間内の時点の復元に使うためだけに残っている時点は、途中までの履歴を返さない
+    with pytest.raises(ValueError):
+        backup.restore(0)
+
+
+def test_restore_returns_max_turns_window(tmp_path):
+    backup = make_backup(tmp_path)
+    data = backup.restore(-3)
+    assert data["seq"] == 80
+    assert [turn["seq"] for turn in data["turns"]] == list(range(51, 81))
+
+
+def test_restore_after_reopen(tmp_path):
+    make_backup(tmp_path)
+    reopened = HistoryBackup(tmp_path, max_turns=30, retention=3)
+    assert reopened.last_seq == 100
+    assert [turn["seq"] for turn in reopened.restore()["turns"]] == list(range(71, 101))
+
+
+def test_base_point_restores_without_earlier_segments(tmp_path):
+    backup = make_backup(tmp_path, count=2)
+    backup.backup(turns(21, 25), 25, base=True)
+    assert [turn["seq"] for turn in backup.restore()["turns"]] == [21, 22, 23, 24, 25]
+
+
+def test_missing_segment_is_reported(tmp_path):
+    backup = make_backup(tmp_path)
+    (backup.segments_dir / f"{backup.entries[-2]['segment']}.jsonl").unlink()
+    assert not backup.is_restorable(-1)
+    with pytest.raises(ValueError):
+        backup.restore(-1)
@@ -0,0 +1,101 @@
+"""会話履歴のジャーナル・まとめ書き・SQLite 保存が再起動後に復元されることの確認"""
+
+import json
+
+import pytest
+
+import core.history_manager as history_manager
+from core.history_manager import HistoryManager
+from memory.sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def open_history(tmp_path):
+    """HistoryManager を作る（終了時にまとめて閉じる）"""
+    opened = []
+
+    def factory(**kwargs):
+        options = {"max_turns": 100, "persist_dir": tmp_path / "history", "flush_window": 0.0, **kwargs}
+        history = HistoryManager(**options)
+        opened.append(history)
+        return history
+
+    yield factory
+    for history in opened:
+        history.close()
+
+
+def texts(history: HistoryManager) -> list[str]:
+    return [turn["text"] for turn in history.turns]
+
+
+def test_journal_is_replayed_without_close(open_history):
+    history = open_history()
+    for i in range(5):
+        history.append("user", f"発言{i}")
+    history.flush()
+    # close せずに停止した場合もジャーナルから復元される
+    assert not history.history_file.exists()
+    reopened = open_history()
+    assert texts(reopened) == [f"発言{i}" for i in range(5)]
+    reopened.append("assistant", "続き")
+    assert reopened._seq == 6
+
+
+def test_incomplete_journal_record_is_discarded(open_history):
+    history = open_history()
+    history.append("user", "最後まで書けた発言")
+    history.flush()
+    with history.journal_file.open("a", encoding="utf-8") as f:
+        f.write('{"role": "user", "text": "書きかけ')
+    reopened = open_history()
+    assert texts(reopened) == ["最後まで書けた発言"]
+    assert history.journal_file.read_bytes().endswith(b"\n")
+
+
+def test_close_merges_journal_into_snapshot(open_history):
+    history = open_history()
+    for i in range(3):
+        history.append("user", f"発言{i}")
+    history.close()
+    assert history.journal_file.read_text(encoding="utf-8") == ""
+    data = json.loads(history.history_file.read_text(encoding="utf-8"))
+    assert data["seq"] == 3
+    assert texts(open_history()) == ["発言0", "発言1", "発言2"]
+
+
+def test_writer_coalesces_appends_within_window(open_history, monkeypatch):
+    writes = []
+    original = history_manager.HistoryManager._append_journal
+
+    def record_write(self, records):
+        writes.append(len(records))
+        original(self, records)
+
+    monkeypatch.setattr(history_manager.HistoryManager, "_append_journal", record_write)
+    history = open_history(flush_window=60.0)
+    history.append("user", "コメント")
+    history.append("assistant", "応答")
+    # まとめ書きの待ち時間中でも close で書き出される
+    history.close()
+    assert writes == [2]
+    assert texts(open_history()) == ["コメント", "応答"]
+
+
+def test_sqlite_history_is_restored_after_reopen(open_history, tmp_path):
+    store = SQLiteStore(tmp_path / "store.db")
+    history = open_history(store=store, max_turns=3)
+    for i in range(5):
+        history.append("user", f"発言{i}")
+    history.close()
+    store.close()
+
+    store = SQLiteStore(tmp_path / "store.db")
+    try:
+        reopened = open_history(store=store, max_turns=3)
+        assert texts(reopened) == ["発言2", "発言3", "発言4"]
+        # 保持件数より古い会話も検索できる
+        assert len(reopened.query_turns(role="user")) == 5
+        reopened.close()
+    finally:
+        store.close()
@@ -0,0 +1,41 @@
+"""ジャーナルの再生時にインデックスを作り直さないことの確認"""
+
+import faiss
+
+from memory.hipporag_memory import VTuberMemory
+
+
+def test_replay_appends_to_snapshot_index(tmp_path, monkeypatch, open_memory):
+    memory = open_memory(tmp_path)
+    memory.add_many([f"記憶その{i}" for i in range(30)])
+    memory.compact()
+    memory.add_many([f"新しい記憶その{i}" for i in range(5)])
+    memory.close()
+
+    builds = []
+    original = VTuberMemory._build_index_from_embeddings
+    monkeypatch.setattr(VTuberMemory, "_build_index_from_embeddings",
+                        lambda self: builds.append(len(self.embeddings)) or original(self))
+
+    reopened = open_memory(tmp_path)
+    assert reopened.load_state == "ready"
+    assert builds == []
+    assert reopened.index.ntotal == len(reopened.documents) == 35
+    for doc in reopened.documents:
+        assert reopened.retrieve(doc.page_content, top_k=1)[0].id == doc.id
+    reopened.close()
+
+
+def test_index_out_of_sync_with_snapshot_is_rebuilt(tmp_path, open_memory, dimension):
+    memory = open_memory(tmp_path)
+    memory.add_many([f"記憶その{i}" for i in range(30)])
+    memory.compact()
+    memory.close()
+    # スナップショットの件数と合わないインデックス（チェックサムの記録がない旧形式）
+    (tmp_path / "snapshot.json").write_text('{"lsn": 1, "count": 30, "next_id": 30}', encoding="utf-8")
+    faiss.write_index(faiss.IndexFlatIP(dimension), str(tmp_path / "index.faiss"))
+
+    reopened = open_memory(tmp_path)
+    assert reopened.load_state == "ready"
+    assert reopened.index.ntotal == 30
+    reopened.close()
@@ -0,0 +1,64 @@
+"""語彙一致による類似度下限の回避が、ありふれた語の一致では起きないことの確認"""
+
+import numpy as np
+import pytest
+
+from memory.lexical_index import BM25Index
+
+AXES = 8  # 記憶とクエリの向きを決める埋め込みの次元数
+
+CORPUS = [
+    "今日は雨が降っていて寒いね",
+    "今日はゲーム配信をするよ",
+    "昨日の配信は楽しかった",
+    "ポチは柴犬で散歩が大好き",
+    "新しいマイクを買いました",
+    "晩ご飯はカレーにしようかな",
+    "週末は友達と映画を見に行く",
+    "最近は寝る前に本を読んでいる",
+]
+# 記憶が増えると珍しくない語でも生の BM25 スコアが大きくなる
+FILLER = [f"過去の雑談ログ{i}番" for i in range(200)]
+
+
+def unit(index: int, weight: float = 1.0, other: int = AXES - 1) -> np.ndarray:
+    """index 軸方向に weight、other 軸方向に残りの成分を持つ単位ベクトル"""
+    vector = np.zeros(AXES, dtype=np.float32)
+    vector[index] = weight
+    vector[other] = np.sqrt(max(0.0, 1.0 - weight ** 2))
+    return vector
+
+
+@pytest.fixture
+def memory(tmp_path, open_memory):
+    # 記憶はすべてクエリとほぼ直交する（類似度 0.1）ようにする
+    vectors = {text: unit(i % (AXES - 1)) for i, text in enumerate(CORPUS + FILLER)}
+    vectors["今日は何して遊ぼうかな"] = unit(0, 0.1)
+    vectors["ポチ"] = unit(3, 0.1)
+    memory = open_memory(tmp_path, vectors=vectors, min_similarity=0.5, hybrid=True, lexical_min_score=0.5)
+    memory.add_many(CORPUS + FILLER, [{"role": "user"} for _ in CORPUS + FILLER])
+    return memory
+
+
+def test_ordinary_token_overlap_does_not_bypass_similarity_cutoff(memory):
+    """「今日は」が一致するだけの意味的に遠い記憶は返さない"""
+    raw = dict(memory._lexical.search("今日は何して遊ぼうかな"))
+    # 生のスコアは以前の固定閾値（5.0）を超えている
+    assert max(raw.values()) >= 5.0
+    assert memory.retrieve("今日は何して遊ぼうかな") == []
+
+
+def test_rare_term_match_bypasses_similarity_cutoff(memory):
+    """固有名詞が一致した記憶は類似度が低くても返す"""
+    hits = memory.retrieve("ポチ")
+    assert [hit.text for hit in hits] == ["ポチは柴犬で散歩が大好き"]
+    assert hits[0].score < 0.5
+
+
+def test_normalized_scores_are_bounded():
+    index = BM25Index()
+    for i, text in enumerate(CORPUS):
+        index.add(i, text)
+    scores = [score for _, score in index.search("今日は雨が降っていて寒いね", normalize=True)]
+    assert scores[0] == pytest.approx(1.0, abs=0.2)
+    assert all(0.0 <= score <= 1.0 for score in scores)
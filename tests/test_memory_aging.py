@@ -0,0 +1,33 @@
+"""古さの判定が、重複として再び現れた日時（last_seen）を使うことの確認"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+OLD = (datetime.now() - timedelta(days=365)).isoformat()
+NOW = datetime.now().isoformat()
+
+
+@pytest.fixture
+def memory(tmp_path, open_memory):
+    memory = open_memory(tmp_path, dedup_threshold=0.95)
+    memory.add_many(
+        ["ポチは柴犬です", "昔のゲームの話"],
+        [{"role": "user", "author": "常連", "timestamp": OLD}, {"role": "user", "author": "常連", "timestamp": OLD}]
+    )
+    # 同じ話題がもう一度出てきた（重複として統合され、last_seen だけが新しくなる）
+    memory.add_many(["ポチは柴犬です"], [{"role": "user", "author": "常連", "timestamp": NOW}])
+    return memory
+
+
+def test_recently_seen_duplicate_is_not_consolidated(memory):
+    cutoff = datetime.now() - timedelta(days=30)
+    documents, _ = memory.consolidation_candidates(cutoff, limit=10)
+    assert [doc.page_content for doc in documents] == ["昔のゲームの話"]
+
+
+def test_recently_seen_duplicate_is_not_archived(memory):
+    assert memory.archive_old(datetime.now() - timedelta(days=30)) == 1
+    assert [doc.page_content for doc in memory.documents] == ["ポチは柴犬です"]
+    assert memory.documents[0].metadata["hit_count"] == 2
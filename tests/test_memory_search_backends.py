@@ -0,0 +1,58 @@
+"""トリプル検索が JSON と SQLite のどちらに保存しても同じ結果になることの確認"""
+
+import pytest
+
+from core.config import Config
+from core.memory_search import MemorySearcher
+from memory.sqlite_store import SQLiteStore
+
+TRIPLES = [
+    ("ポチ-犬種-柴犬", "ポチは柴犬で散歩が大好き"),
+    ("レイ-好物-プリン", "レイはプリンが好き"),
+    ("視聴者A-趣味-釣り", "視聴者Aは週末に釣りに行く"),
+    ("タマ-種類-猫", "タマは三毛猫でよく寝る"),
+]
+
+QUERIES = ["ポチ 柴犬の散歩", "柴犬が好き", "ポチ", "プリン", "三毛猫"]
+
+
+@pytest.fixture
+def searchers(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "HIPPORAG_DIR", str(tmp_path / "json"))
+    json_searcher = MemorySearcher()
+    store = SQLiteStore(tmp_path / "store.db")
+    sqlite_searcher = MemorySearcher(store=store)
+    for triple, text in TRIPLES:
+        json_searcher.add_memory(triple, text)
+        sqlite_searcher.add_memory(triple, text)
+    yield json_searcher, sqlite_searcher, store
+    store.close()
+
+
+def results(searcher: MemorySearcher, query: str) -> list:
+    return [(item.triple, round(item.score, 6)) for item in searcher.search_memory(query, top_k=3)]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_backends_return_the_same_results(searchers, query):
+    json_searcher, sqlite_searcher, _ = searchers
+    expected = results(json_searcher, query)
+    assert expected
+    assert results(sqlite_searcher, query) == expected
+
+
+def test_short_and_partial_queries_find_the_triple(searchers):
+    _, sqlite_searcher, _ = searchers
+    # 2文字の固有名詞と、本文と語形の異なるクエリ
+    assert sqlite_searcher.search_memory("ポチ 柴犬の散歩")[0].triple == "ポチ-犬種-柴犬"
+    assert "ポチ-犬種-柴犬" in [item.triple for item in sqlite_searcher.search_memory("柴犬が好き")]
+
+
+def test_sqlite_index_is_restored_after_reopen(searchers, tmp_path):
+    json_searcher, _, store = searchers
+    reopened = MemorySearcher(store=store)
+    for query in QUERIES:
+        assert results(reopened, query) == results(json_searcher, query)
+    reopened.clear_memories()
+    assert reopened.search_memory("ポチ") == []
+    assert store.triple_count() == 0
@@ -0,0 +1,35 @@
+"""量子化したインデックスの学習条件と、検索結果の類似度が正確な値になることの確認"""
+
+import faiss
+import numpy as np
+
+from memory.index_factory import (
+    PQ_MIN_TRAIN, PQ_NBITS, build_index, needs_retrain, normalize_vectors, resolve_storage, search_rescored
+)
+
+
+def test_pq_waits_for_enough_training_data():
+    assert resolve_storage("pq", "flat", 256) == "float16"
+    assert resolve_storage("pq", "flat", PQ_MIN_TRAIN - 1) == "float16"
+    assert resolve_storage("pq", "flat", PQ_MIN_TRAIN) == "pq"
+
+
+def test_pq_is_retrained_when_the_corpus_doubles():
+    index = faiss.IndexPQ(8, 8, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+    assert not needs_retrain(index, PQ_MIN_TRAIN * 2 - 1, PQ_MIN_TRAIN)
+    assert needs_retrain(index, PQ_MIN_TRAIN * 2, PQ_MIN_TRAIN)
+    assert not needs_retrain(faiss.IndexFlatIP(8), PQ_MIN_TRAIN * 2, PQ_MIN_TRAIN)
+
+
+def test_pq_search_is_rescored_with_exact_cosine():
+    corpus = normalize_vectors(np.random.default_rng(0).standard_normal((1000, 8)).astype(np.float32))
+    # 学習データの少ない粗いコードブックでも、返す類似度は元の埋め込みとの内積になる
+    index = build_index("flat", corpus, storage="pq")
+    query = corpus[:1]
+    approximate, _ = index.search(query, 5)
+    hits = search_rescored(index, query, 5, lambda positions: corpus[positions])
+    assert hits[0][0] == 0
+    exact = corpus[[position for position, _ in hits]] @ query[0]
+    np.testing.assert_allclose([score for _, score in hits], exact, rtol=0, atol=1e-6)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert not np.allclose(approximate[0], exact, atol=1e-3)
@@ -0,0 +1,34 @@
+"""再ランキングで類似度と融合スコアを別々の特徴量として扱うことの確認"""
+
+from datetime import datetime, timedelta
+
+from memory.hipporag_memory import MemoryHit
+from memory.reranker import RerankWeights, rerank
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def hit(doc_id: int, score: float, relevance: float, age_hours: float) -> MemoryHit:
+    timestamp = (NOW - timedelta(hours=age_hours)).isoformat()
+    return MemoryHit(id=doc_id, text=f"記憶{doc_id}", metadata={"role": "user", "timestamp": timestamp},
+                     score=score, relevance=relevance)
+
+
+def test_cosine_similarity_is_not_replaced_by_fused_relevance():
+    # 類似度の高い古い記憶と、融合スコアでわずかに上回るだけの新しい記憶
+    similar = hit(1, score=0.9, relevance=0.38, age_hours=24 * 365)
+    recent = hit(2, score=0.6, relevance=0.5, age_hours=0)
+    ranked = rerank([recent, similar], RerankWeights(), {}, now=NOW)
+    assert [h.id for h in ranked] == [1, 2]
+
+
+def test_fused_relevance_breaks_ties_between_equal_similarity():
+    ranked = rerank([hit(1, 0.8, 0.4, 0), hit(2, 0.8, 1.0, 0)], RerankWeights(), {}, now=NOW)
+    assert [h.id for h in ranked] == [2, 1]
+    assert abs(ranked[0].rank_score - ranked[1].rank_score - RerankWeights().relevance * 0.6) < 1e-9
+
+
+def test_missing_relevance_contributes_nothing():
+    weights = RerankWeights(recency=0.0, frequency=0.0, role_weights={})
+    ranked = rerank([MemoryHit(id=1, text="記憶", metadata={}, score=0.7)], weights, {}, now=NOW)
+    assert abs(ranked[0].rank_score - 0.7) < 1e-9
@@ -0,0 +1,91 @@
+"""スナップショットの書き込み途中で停止しても、記憶と埋め込みの対応が崩れないことの確認"""
+
+import os
+
+import numpy as np
+import pytest
+
+import memory.hipporag_memory as hipporag_memory
+from memory.hipporag_memory import VTuberMemory
+
+
+def assert_aligned(memory: VTuberMemory) -> None:
+    """各記憶の本文で検索すると、その記憶自身が最上位に来る"""
+    for doc in memory.documents:
+        hits = memory.retrieve(doc.page_content, top_k=1)
+        assert hits and hits[0].id == doc.id
+
+
+@pytest.fixture
+def store(tmp_path, open_memory):
+    memory = open_memory(tmp_path)
+    texts = [f"記憶その{i}" for i in range(40)]
+    memory.add_many(texts, [{"role": "user"} for _ in texts])
+    memory.compact()
+    memory.close()
+    return tmp_path
+
+
+def consolidate(memory: VTuberMemory) -> None:
+    """先頭の10件を要約に置き換える（スナップショットを作り直す）"""
+    ids = [doc.id for doc in memory.documents[:10]]
+    memory.replace_documents([(ids, "要約された記憶", {"role": "summary"})])
+
+
+def test_crash_before_manifest_keeps_previous_snapshot(store, open_memory, monkeypatch):
+    memory = open_memory(store)
+
+    def fail(path, writer):
+        raise OSError("simulated crash")
+    monkeypatch.setattr(hipporag_memory, "atomic_write", fail)
+    with pytest.raises(OSError):
+        consolidate(memory)
+    monkeypatch.undo()
+    memory._executor.shutdown(wait=True)
+
+    reopened = open_memory(store)
+    assert reopened.load_state == "ready"
+    assert len(reopened.documents) == 40
+    assert_aligned(reopened)
+    reopened.close()
+
+
+def test_crash_after_manifest_rolls_forward(store, open_memory, monkeypatch):
+    memory = open_memory(store)
+    replaced = []
+    real_replace = os.replace
+
+    def replace_once(src, dst):
+        if replaced:
+            raise OSError("simulated crash")
+        replaced.append(dst)
+        real_replace(src, dst)
+    monkeypatch.setattr(hipporag_memory.os, "replace", replace_once)
+    with pytest.raises(OSError):
+        consolidate(memory)
+    monkeypatch.undo()
+    memory._executor.shutdown(wait=True)
+
+    reopened = open_memory(store)
+    assert reopened.load_state == "ready"
+    assert len(reopened.documents) == 31
+    assert reopened.documents[-1].page_content == "要約された記憶"
+    assert_aligned(reopened)
+    reopened.close()
+
+
+def test_mismatched_snapshot_is_not_truncated(store, open_memory):
+    # 埋め込みだけが別のスナップショットのものに置き換わった状態
+    embeddings = np.load(store / "embeddings.npy")
+    np.save(store / "embeddings.npy", embeddings[:30])
+
+    reopened = open_memory(store)
+    assert reopened.load_state == "error"
+    # 長期記憶なしで動作を続ける（検索結果は空、追加は保存しない）
+    assert reopened.retrieve("記憶その1") == []
+    assert reopened.retrieve_author("記憶その1", "視聴者") == []
+    reopened.add_many(["新しい記憶"], [{"role": "user"}])
+    reopened.compact()
+    reopened.close()
+    # 読み込みに失敗した状態ではスナップショットを上書きしない
+    assert len(np.load(store / "embeddings.npy")) == 30
@@ -0,0 +1,63 @@
+"""snapshot.json のない旧形式の記憶ストアで、記憶と埋め込みの件数のずれを修復できることの確認"""
+
+import importlib.util
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from conftest import FakeEncoder
+
+spec = importlib.util.spec_from_file_location(
+    "memory_store_doctor", Path(__file__).parent.parent / "examples" / "memory_store_doctor.py")
+doctor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(doctor)
+
+TEXTS = [f"記憶{i}の話" for i in range(6)]
+
+
+@pytest.fixture
+def legacy_store(tmp_path, open_memory):
+    """embeddings.npy の末尾2件が失われ、snapshot.json もない記憶ストア"""
+    memory = open_memory(tmp_path)
+    memory.add_many(TEXTS, [{"role": "user"} for _ in TEXTS])
+    memory.compact()
+    memory.close()
+    (tmp_path / "snapshot.json").unlink()
+    vectors = np.load(tmp_path / "embeddings.npy")
+    np.save(tmp_path / "embeddings.npy", vectors[:-2])
+    return tmp_path
+
+
+def test_drifted_store_cannot_be_loaded(legacy_store, open_memory):
+    memory = open_memory(legacy_store)
+    assert memory.load_state != "ready"
+    assert "repair" in memory.get_status()["error"]
+
+
+def test_repair_without_option_refuses(legacy_store):
+    with pytest.raises(SystemExit):
+        doctor.repair(legacy_store, doctor.Timer(), reencode=False, force=False)
+
+
+def test_repair_force_keeps_aligned_prefix(legacy_store, open_memory):
+    doctor.repair(legacy_store, doctor.Timer(), reencode=False, force=True)
+    memory = open_memory(legacy_store)
+    assert memory.is_ready()
+    assert [doc.page_content for doc in memory.documents] == TEXTS[:4]
+    assert [hit.text for hit in memory.retrieve(TEXTS[3], top_k=1)] == [TEXTS[3]]
+    manifest = json.loads((legacy_store / "snapshot.json").read_text(encoding="utf-8"))
+    assert manifest["count"] == 4 and manifest["next_id"] == 6
+
+
+def test_repair_reencodes_missing_vectors(legacy_store, open_memory, monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setattr(doctor, "encode_documents",
+                        lambda texts, model_name: doctor.normalize_vectors(encoder.encode(texts)))
+    doctor.repair(legacy_store, doctor.Timer(), reencode=True, force=False)
+    memory = open_memory(legacy_store)
+    assert memory.is_ready()
+    assert len(memory.documents) == len(memory.embeddings) == 6
+    for text in TEXTS:
+        assert memory.retrieve(text, top_k=1)[0].text == text